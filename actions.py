@@ -16,315 +16,406 @@
 
 # actions.py
 # contains the key actions for the image viewer. The key actions are
-# the actions that are performed when a key is pressed. The key actions are
-# defined in the key_actions dictionary. The dictionary maps the key to the
-# action that should be performed when the key is pressed. The key_actions
-# dictionary is used in the main.py file to connect the key press event to the
-# action that should be performed.
+# the actions that are performed when a key is pressed. They are declared in
+# the key_registry dictionary, which maps a key, or a tuple of keys doing the
+# same thing, to what the action invalidates and the action itself. Actions
+# only change state; what they invalidate (LINES, EDGES, COLORS or REDRAW
+# alone) is recomputed once on the next frame. key_registry is flattened
+# into key_actions at import so pixruler.py finds the action of a key press
+# with a single lookup.
 from utils import *
+from view import toggle_view
+from video import step_media, toggle_play
+from rays import RAY_COUNTS
+from snap import SNAP_MODES
+import profiler
 import sys
-import cv2
 import gi
 
 gi.require_version("Gtk", "3.0")
 gi.require_version("GdkPixbuf", "2.0")
 from gi.repository import Gtk, GdkPixbuf, Gdk
 
-
-key_actions = {
-    Gdk.KEY_1: lambda self, _: setattr(self, "step_size_mp", 1),
-    Gdk.KEY_2: lambda self, _: setattr(self, "step_size_mp", 2),
-    Gdk.KEY_3: lambda self, _: setattr(self, "step_size_mp", 3),
-    Gdk.KEY_4: lambda self, _: setattr(self, "step_size_mp", 4),
-    Gdk.KEY_5: lambda self, _: setattr(self, "step_size_mp", 5),
-    Gdk.KEY_6: lambda self, _: setattr(self, "step_size_mp", 6),
-    Gdk.KEY_7: lambda self, _: setattr(self, "step_size_mp", 7),
-    Gdk.KEY_8: lambda self, _: setattr(self, "step_size_mp", 8),
-    Gdk.KEY_9: lambda self, _: setattr(self, "step_size_mp", 9),
-    Gdk.KEY_0: lambda self, _: setattr(self, "step_size_mp", 10),
-    Gdk.KEY_Return: lambda _, __: save_screenshot(),
-    (Gdk.KEY_h, Gdk.KEY_Left): lambda self, _: (
-        setattr(
-            self,
-            "cursor_pos",
-            [
-                adjust_value(self.cursor_pos[0], self.step_size, False, 0),
-                self.cursor_pos[1],
-            ],
+key_registry = {
+    Gdk.KEY_1: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 1)),
+    Gdk.KEY_2: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 2)),
+    Gdk.KEY_3: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 3)),
+    Gdk.KEY_4: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 4)),
+    Gdk.KEY_5: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 5)),
+    Gdk.KEY_6: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 6)),
+    Gdk.KEY_7: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 7)),
+    Gdk.KEY_8: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 8)),
+    Gdk.KEY_9: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 9)),
+    Gdk.KEY_0: (REDRAW, lambda self, _: setattr(self, "step_size_mp", 10)),
+    Gdk.KEY_Return: (
+        REDRAW,
+        lambda self, event: save_screenshot(
+            self, not event.state & Gdk.ModifierType.SHIFT_MASK
         ),
-        live_colors(self),
-        update_lines(self),
     ),
-    (Gdk.KEY_l, Gdk.KEY_Right): lambda self, _: (
-        setattr(
-            self,
-            "cursor_pos",
-            [
-                adjust_value(self.cursor_pos[0], self.step_size, True, 0),
-                self.cursor_pos[1],
-            ],
+    (Gdk.KEY_h, Gdk.KEY_Left): (
+        LINES,
+        lambda self, _: (
+            setattr(
+                self,
+                "cursor_pos",
+                [
+                    adjust_value(self.cursor_pos[0], self.step_size, False, 0),
+                    self.cursor_pos[1],
+                ],
+            )
         ),
-        live_colors(self),
-        update_lines(self),
     ),
-    (Gdk.KEY_j, Gdk.KEY_Down): lambda self, _: (
-        setattr(
-            self,
-            "cursor_pos",
-            [
-                self.cursor_pos[0],
-                adjust_value(
+    (Gdk.KEY_l, Gdk.KEY_Right): (
+        LINES,
+        lambda self, _: (
+            setattr(
+                self,
+                "cursor_pos",
+                [
+                    adjust_value(
+                        self.cursor_pos[0],
+                        self.step_size,
+                        True,
+                        0,
+                        self.img.shape[1] - 1,
+                    ),
                     self.cursor_pos[1],
-                    self.step_size,
-                    True,
-                    0,
-                    self.img.shape[0] - 1,
-                ),
-            ],
+                ],
+            )
         ),
-        live_colors(self),
-        update_lines(self),
     ),
-    (Gdk.KEY_k, Gdk.KEY_Up): lambda self, _: (
-        setattr(
-            self,
-            "cursor_pos",
-            [
-                self.cursor_pos[0],
-                adjust_value(self.cursor_pos[1], self.step_size, False, 0),
-            ],
+    (Gdk.KEY_j, Gdk.KEY_Down): (
+        LINES,
+        lambda self, _: (
+            setattr(
+                self,
+                "cursor_pos",
+                [
+                    self.cursor_pos[0],
+                    adjust_value(
+                        self.cursor_pos[1],
+                        self.step_size,
+                        True,
+                        0,
+                        self.img.shape[0] - 1,
+                    ),
+                ],
+            )
         ),
-        live_colors(self),
-        update_lines(self),
     ),
-    Gdk.KEY_H: lambda self, _: (
-        setattr(
-            self,
-            "stats_pos",
-            [
-                adjust_value(self.stats_pos[0], self.step_size, False, 0),
-                self.stats_pos[1],
-            ],
+    (Gdk.KEY_k, Gdk.KEY_Up): (
+        LINES,
+        lambda self, _: (
+            setattr(
+                self,
+                "cursor_pos",
+                [
+                    self.cursor_pos[0],
+                    adjust_value(self.cursor_pos[1], self.step_size, False, 0),
+                ],
+            )
         ),
-        live_colors(self),
     ),
-    Gdk.KEY_L: lambda self, _: (
-        setattr(
-            self,
-            "stats_pos",
-            [
-                adjust_value(self.stats_pos[0], self.step_size, True, 0),
-                self.stats_pos[1],
-            ],
+    Gdk.KEY_H: (
+        COLORS,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_pos",
+                [
+                    adjust_value(self.stats_pos[0], self.step_size, False, 0),
+                    self.stats_pos[1],
+                ],
+            )
         ),
-        live_colors(self),
     ),
-    Gdk.KEY_J: lambda self, _: (
-        setattr(
-            self,
-            "stats_pos",
-            [
-                self.stats_pos[0],
-                adjust_value(self.stats_pos[1], self.step_size, True, 0),
-            ],
+    Gdk.KEY_L: (
+        COLORS,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_pos",
+                [
+                    adjust_value(self.stats_pos[0], self.step_size, True, 0),
+                    self.stats_pos[1],
+                ],
+            )
         ),
-        live_colors(self),
     ),
-    Gdk.KEY_K: lambda self, _: (
-        setattr(
-            self,
-            "stats_pos",
-            [
-                self.stats_pos[0],
-                adjust_value(self.stats_pos[1], self.step_size, False, 0),
-            ],
+    Gdk.KEY_J: (
+        COLORS,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_pos",
+                [
+                    self.stats_pos[0],
+                    adjust_value(self.stats_pos[1], self.step_size, True, 0),
+                ],
+            )
         ),
-        live_colors(self),
     ),
-    Gdk.KEY_t: lambda self, _: (
-        setattr(
-            self,
-            "line_thickness",
-            adjust_value(self.line_thickness, self.step_size / 3, True, 0.7, 10),
+    Gdk.KEY_K: (
+        COLORS,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_pos",
+                [
+                    self.stats_pos[0],
+                    adjust_value(self.stats_pos[1], self.step_size, False, 0),
+                ],
+            )
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_T: lambda self, _: (
-        setattr(
-            self,
-            "line_thickness",
-            adjust_value(self.line_thickness, self.step_size / 3, False, 0.7),
+    Gdk.KEY_t: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "line_thickness",
+                adjust_value(self.line_thickness, self.step_size / 3, True, 0.7, 10),
+            )
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_f: lambda self, _: (
-        setattr(
-            self,
-            "font_size",
-            adjust_value(self.font_size, self.step_size / 2, True, 0),
-        )
+    Gdk.KEY_T: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "line_thickness",
+                adjust_value(self.line_thickness, self.step_size / 3, False, 0.7),
+            )
+        ),
     ),
-    Gdk.KEY_F: lambda self, _: (
-        setattr(
-            self,
-            "font_size",
-            adjust_value(self.font_size, self.step_size / 2, False, 0),
-        )
+    Gdk.KEY_f: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "font_size",
+                adjust_value(self.font_size, self.step_size / 2, True, 0),
+            )
+        ),
     ),
-    Gdk.KEY_s: lambda self, _: (
-        setattr(
-            self,
-            "stats_font_size",
-            adjust_value(self.stats_font_size, self.step_size / 2, True, 0),
-        )
+    Gdk.KEY_F: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "font_size",
+                adjust_value(self.font_size, self.step_size / 2, False, 0),
+            )
+        ),
     ),
-    Gdk.KEY_S: lambda self, _: (
-        setattr(
-            self,
-            "stats_font_size",
-            adjust_value(self.stats_font_size, self.step_size / 2, False, 0),
-        )
+    Gdk.KEY_s: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_font_size",
+                adjust_value(self.stats_font_size, self.step_size / 2, True, 0),
+            )
+        ),
     ),
-    Gdk.KEY_o: lambda self, _: (
-        setattr(
-            self,
-            "offset",
-            [
-                adjust_value(self.offset[0], self.step_size, True),
-                self.offset[1],
-            ],
-        )
-    ),
-    Gdk.KEY_O: lambda self, _: (
-        setattr(
-            self,
-            "offset",
-            [
-                adjust_value(self.offset[0], self.step_size, False),
-                self.offset[1],
-            ],
-        )
-    ),
-    Gdk.KEY_p: lambda self, _: (
-        setattr(
-            self,
-            "offset",
-            [
-                self.offset[0],
-                adjust_value(self.offset[1], self.step_size, True),
-            ],
-        )
-    ),
-    Gdk.KEY_P: lambda self, _: (
-        setattr(
-            self,
-            "offset",
-            [
-                self.offset[0],
-                adjust_value(self.offset[1], self.step_size, False),
-            ],
-        )
-    ),
-    Gdk.KEY_c: lambda self, _: (
-        setattr(self, "colors", [self.colors[-1]] + self.colors[:-1]),
-        setattr(self, "line_text_color", self.colors[1]),
-        setattr(self, "stats_text_color", self.colors[1]),
-        setattr(self, "line_color", self.colors[0]),
-    ),
-    Gdk.KEY_C: lambda self, _: (
-        setattr(self, "is_live_colors", not self.is_live_colors)
-    ),
-    Gdk.KEY_r: lambda self, _: (
-        setattr(
-            self,
-            "lower_threshold",
-            adjust_value(
-                self.lower_threshold,
-                self.step_size,
-                True,
-                0,
-                self.upper_threshold - 1,
-            ),
+    Gdk.KEY_S: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "stats_font_size",
+                adjust_value(self.stats_font_size, self.step_size / 2, False, 0),
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    Gdk.KEY_o: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "offset",
+                [
+                    adjust_value(self.offset[0], self.step_size, True),
+                    self.offset[1],
+                ],
+            )
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_R: lambda self, _: (
-        setattr(
-            self,
-            "lower_threshold",
-            adjust_value(
-                self.lower_threshold,
-                self.step_size,
-                False,
-                0,
-                self.upper_threshold - 1,
-            ),
+    Gdk.KEY_O: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "offset",
+                [
+                    adjust_value(self.offset[0], self.step_size, False),
+                    self.offset[1],
+                ],
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    Gdk.KEY_p: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "offset",
+                [
+                    self.offset[0],
+                    adjust_value(self.offset[1], self.step_size, True),
+                ],
+            )
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_u: lambda self, _: (
-        setattr(
-            self,
-            "upper_threshold",
-            adjust_value(self.upper_threshold, self.step_size, True),
+    Gdk.KEY_P: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "offset",
+                [
+                    self.offset[0],
+                    adjust_value(self.offset[1], self.step_size, False),
+                ],
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    Gdk.KEY_c: (
+        REDRAW,
+        lambda self, _: (
+            setattr(self, "colors", [self.colors[-1]] + self.colors[:-1]),
+            setattr(self, "line_text_color", self.colors[1]),
+            setattr(self, "stats_text_color", self.colors[1]),
+            setattr(self, "line_color", self.colors[0]),
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_U: lambda self, _: (
-        setattr(
-            self,
-            "upper_threshold",
-            adjust_value(
-                self.upper_threshold,
-                self.step_size,
-                False,
-                self.lower_threshold + 1,
-            ),
+    Gdk.KEY_C: (
+        COLORS,
+        lambda self, _: (setattr(self, "is_live_colors", not self.is_live_colors)),
+    ),
+    Gdk.KEY_r: (
+        EDGES,
+        lambda self, _: (
+            setattr(
+                self,
+                "lower_threshold",
+                adjust_value(
+                    self.lower_threshold,
+                    self.step_size,
+                    True,
+                    0,
+                    self.upper_threshold - 1,
+                ),
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    Gdk.KEY_R: (
+        EDGES,
+        lambda self, _: (
+            setattr(
+                self,
+                "lower_threshold",
+                adjust_value(
+                    self.lower_threshold,
+                    self.step_size,
+                    False,
+                    0,
+                    self.upper_threshold - 1,
+                ),
+            )
         ),
-        update_lines(self),
     ),
-    Gdk.KEY_n: lambda self, _: (
-        setattr(
-            self,
-            "current_arg_index",
-            adjust_value(self.current_arg_index, 1, True, None, self.arg_count - 1),
+    Gdk.KEY_u: (
+        EDGES,
+        lambda self, _: (
+            setattr(
+                self,
+                "upper_threshold",
+                adjust_value(self.upper_threshold, self.step_size, True),
+            )
         ),
-        prepare_image(self, sys.argv[self.current_arg_index]),
-        update_edges_and_pixbuf(self),
-        update_lines(self),
     ),
-    Gdk.KEY_N: lambda self, _: (
-        setattr(
+    Gdk.KEY_U: (
+        EDGES,
+        lambda self, _: (
+            setattr(
+                self,
+                "upper_threshold",
+                adjust_value(
+                    self.upper_threshold,
+                    self.step_size,
+                    False,
+                    self.lower_threshold + 1,
+                ),
+            )
+        ),
+    ),
+    Gdk.KEY_a: (
+        LINES,
+        lambda self, _: setattr(
             self,
-            "current_arg_index",
-            adjust_value(self.current_arg_index, 1, False, 1),
+            "ray_count",
+            RAY_COUNTS[(RAY_COUNTS.index(self.ray_count) + 1) % len(RAY_COUNTS)],
+        ),
+    ),
+    Gdk.KEY_w: (
+        LINES,
+        lambda self, _: setattr(
+            self, "ray_rotation", (self.ray_rotation + self.step_size) % 360
+        ),
+    ),
+    Gdk.KEY_W: (
+        LINES,
+        lambda self, _: setattr(
+            self, "ray_rotation", (self.ray_rotation - self.step_size) % 360
         ),
-        prepare_image(self, sys.argv[self.current_arg_index]),
-        update_edges_and_pixbuf(self),
-        update_lines(self),
     ),
-    Gdk.KEY_q: lambda self, _: Gtk.main_quit(),
+    Gdk.KEY_e: (
+        REDRAW,
+        lambda self, _: (
+            setattr(
+                self,
+                "snap_mode",
+                SNAP_MODES[(SNAP_MODES.index(self.snap_mode) + 1) % len(SNAP_MODES)],
+            ),
+            rebuild_derived(self, "snap_map"),
+        ),
+    ),
+    Gdk.KEY_b: (
+        LINES,
+        lambda self, _: (
+            setattr(self, "show_elements", not self.show_elements),
+            rebuild_derived(self, "element_index"),
+        ),
+    ),
+    Gdk.KEY_E: (
+        REDRAW,
+        lambda self, _: (
+            setattr(self, "show_edges", not self.show_edges),
+            rebuild_derived(self, "edge_overlay"),
+            self.queue_draw(),
+        ),
+    ),
+    Gdk.KEY_n: (LINES, lambda self, _: step_media(self, True)),
+    Gdk.KEY_N: (LINES, lambda self, _: step_media(self, False)),
+    Gdk.KEY_space: (REDRAW, lambda self, _: toggle_play(self)),
+    Gdk.KEY_z: (REDRAW, lambda self, _: toggle_view(self)),
+    Gdk.KEY_i: (REDRAW, lambda self, _: profiler.toggle_overlay()),
+    Gdk.KEY_q: (REDRAW, lambda self, _: Gtk.main_quit()),
 }
+
+
+def flatten(registry):
+    # One entry per keyval, tuple keys are alternatives for the same action
+    actions = {}
+    for keys, (invalidates, action) in registry.items():
+        for key in keys if isinstance(keys, tuple) else (keys,):
+            actions[key] = (invalidates, action)
+    return actions
+
+
+key_actions = flatten(key_registry)
 # -------------------------------------------------------
 # Mouse Button
 # -------------------------------------------------------
@@ -332,15 +423,18 @@ button_actions = {
     (
         Gdk.EventType.BUTTON_PRESS,
         Gdk.BUTTON_PRIMARY,
-    ): lambda self, _: (
-        setattr(self, "colors", [self.colors[-1]] + self.colors[:-1]),
-        setattr(self, "line_text_color", self.colors[1]),
-        setattr(self, "stats_text_color", self.colors[1]),
-        setattr(self, "line_color", self.colors[0]),
+    ): (
+        REDRAW,
+        lambda self, _: (
+            setattr(self, "colors", [self.colors[-1]] + self.colors[:-1]),
+            setattr(self, "line_text_color", self.colors[1]),
+            setattr(self, "stats_text_color", self.colors[1]),
+            setattr(self, "line_color", self.colors[0]),
+        ),
     ),
-    (Gdk.EventType.BUTTON_PRESS, Gdk.BUTTON_SECONDARY): lambda self, event: (
-        setattr(self, "stats_pos", [int(event.x), int(event.y)]),
-        live_colors(self),
+    (Gdk.EventType.BUTTON_PRESS, Gdk.BUTTON_SECONDARY): (
+        COLORS,
+        lambda self, event: setattr(self, "stats_pos", [int(event.x), int(event.y)]),
     ),
 }
 # -------------------------------------------------------
@@ -350,99 +444,105 @@ scroll_actions = {
     (
         Gdk.EventType.SCROLL,
         (Gdk.ModifierType.MOD1_MASK | Gdk.ModifierType.LOCK_MASK),
-    ): lambda self, event: (
-        setattr(
-            self,
-            "font_size",
-            adjust_value(
-                self.font_size,
-                self.step_size,
-                event.direction == Gdk.ScrollDirection.UP,
-                0,
-            ),
-        )
-    ),
-    (Gdk.EventType.SCROLL, Gdk.ModifierType.MOD1_MASK): lambda self, event: (
-        setattr(
-            self,
-            "stats_font_size",
-            adjust_value(
-                self.stats_font_size,
-                self.step_size,
-                event.direction == Gdk.ScrollDirection.UP,
-                0,
-            ),
-        )
-    ),
-    (
-        Gdk.EventType.SCROLL,
-        (Gdk.ModifierType.SHIFT_MASK | Gdk.ModifierType.LOCK_MASK),
-    ): lambda self, event: (
-        setattr(
-            self,
-            "offset",
-            [
+    ): (
+        REDRAW,
+        lambda self, event: (
+            setattr(
+                self,
+                "font_size",
                 adjust_value(
-                    self.offset[0],
+                    self.font_size,
                     self.step_size,
                     event.direction == Gdk.ScrollDirection.UP,
+                    0,
                 ),
-                self.offset[1],
-            ],
-        )
+            )
+        ),
     ),
-    (Gdk.EventType.SCROLL, Gdk.ModifierType.SHIFT_MASK): lambda self, event: (
-        setattr(
-            self,
-            "offset",
-            [
-                self.offset[0],
+    (Gdk.EventType.SCROLL, Gdk.ModifierType.MOD1_MASK): (
+        REDRAW,
+        lambda self, event: (
+            setattr(
+                self,
+                "stats_font_size",
                 adjust_value(
-                    self.offset[1],
+                    self.stats_font_size,
                     self.step_size,
                     event.direction == Gdk.ScrollDirection.UP,
+                    0,
                 ),
-            ],
-        )
+            )
+        ),
     ),
     (
         Gdk.EventType.SCROLL,
-        (Gdk.ModifierType.CONTROL_MASK | Gdk.ModifierType.LOCK_MASK),
-    ): lambda self, event: (
-        setattr(
-            self,
-            "lower_threshold",
-            adjust_value(
-                self.lower_threshold,
-                self.step_size,
-                event.direction == Gdk.ScrollDirection.UP,
-                0,
-                self.upper_threshold - 1,
-            ),
+        (Gdk.ModifierType.SHIFT_MASK | Gdk.ModifierType.LOCK_MASK),
+    ): (
+        REDRAW,
+        lambda self, event: (
+            setattr(
+                self,
+                "offset",
+                [
+                    adjust_value(
+                        self.offset[0],
+                        self.step_size,
+                        event.direction == Gdk.ScrollDirection.UP,
+                    ),
+                    self.offset[1],
+                ],
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    (Gdk.EventType.SCROLL, Gdk.ModifierType.SHIFT_MASK): (
+        REDRAW,
+        lambda self, event: (
+            setattr(
+                self,
+                "offset",
+                [
+                    self.offset[0],
+                    adjust_value(
+                        self.offset[1],
+                        self.step_size,
+                        event.direction == Gdk.ScrollDirection.UP,
+                    ),
+                ],
+            )
         ),
-        update_lines(self),
     ),
-    (Gdk.EventType.SCROLL, Gdk.ModifierType.CONTROL_MASK): lambda self, event: (
-        setattr(
-            self,
-            "upper_threshold",
-            adjust_value(
-                self.upper_threshold,
-                self.step_size,
-                event.direction == Gdk.ScrollDirection.UP,
-                self.lower_threshold + 1,
-            ),
+    (
+        Gdk.EventType.SCROLL,
+        (Gdk.ModifierType.CONTROL_MASK | Gdk.ModifierType.LOCK_MASK),
+    ): (
+        EDGES,
+        lambda self, event: (
+            setattr(
+                self,
+                "lower_threshold",
+                adjust_value(
+                    self.lower_threshold,
+                    self.step_size,
+                    event.direction == Gdk.ScrollDirection.UP,
+                    0,
+                    self.upper_threshold - 1,
+                ),
+            )
         ),
-        setattr(
-            self,
-            "edges",
-            cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold),
+    ),
+    (Gdk.EventType.SCROLL, Gdk.ModifierType.CONTROL_MASK): (
+        EDGES,
+        lambda self, event: (
+            setattr(
+                self,
+                "upper_threshold",
+                adjust_value(
+                    self.upper_threshold,
+                    self.step_size,
+                    event.direction == Gdk.ScrollDirection.UP,
+                    self.lower_threshold + 1,
+                ),
+            )
         ),
-        update_lines(self),
     ),
 }
@@ -0,0 +1,265 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# bench.py
+# contains the benchmark harness for the capture, edge detection and
+# measurement hot paths. Every stage is timed at 1080p, 1440p, 4K and 8K on
+# generated images (and on real ones passed with --image), the median and
+# p99 latency and the peak traced memory are reported, and the results can
+# be saved as JSON and compared against a previous run.
+#
+# usage: python bench.py [--output new.json] [--compare old.json]
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import cv2
+import cairo
+from utils import *
+from pixruler import ScreenCaptureWindow
+
+RESOLUTIONS = {
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440),
+    "4K": (3840, 2160),
+    "8K": (7680, 4320),
+}
+SEED = 958
+
+
+class BenchState:
+    # Stands in for the window, the utils functions only need the attributes
+    pass
+
+
+def synthetic_image(width, height, rng):
+    # Smooth gradients with noise, few clean edges
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    img = (x[None, :] * 0.6 + y[:, None] * 0.4)[..., None].repeat(3, axis=2)
+    img += rng.normal(0, 12, img.shape).astype(np.float32)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def ui_image(width, height, rng):
+    # Flat panels, buttons, borders and text, like an application window
+    img = np.full((height, width, 3), 240, dtype=np.uint8)
+    scale = width / 1920
+    for _ in range(int(150 * scale * scale) + 20):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w = rng.integers(int(20 * scale) + 2, width // 3)
+        h = rng.integers(int(10 * scale) + 2, height // 6)
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(img, (int(x), int(y)), (int(x + w), int(y + h)), color, -1)
+        cv2.rectangle(img, (int(x), int(y)), (int(x + w), int(y + h)), (60,) * 3, 1)
+    for _ in range(int(300 * scale * scale) + 20):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        cv2.putText(
+            img, "Lorem ipsum 0123", (int(x), int(y)), 0, 0.5 * scale, (20,) * 3, 1
+        )
+    return img
+
+
+def measure(fn, repeat):
+    """Median and p99 in milliseconds over repeat runs and peak memory in MiB."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    # One extra run under tracemalloc so the tracing does not skew the times
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": float(np.median(times)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "peak_mib": peak / 2**20,
+        "runs": repeat,
+    }
+
+
+def bench_image(name, rgb, repeat, positions):
+    height, width = rgb.shape[:2]
+    rng = np.random.default_rng(SEED)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.png")
+        cv2.imwrite(path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        results["load_image"] = measure(lambda: load_image(path), repeat)
+        img = load_image(path)
+
+    state = BenchState()
+    set_defaults(state)
+    # Shown at 1:1, like on a monitor of the same size
+    state.view_size = (width, height)
+    state.img = img
+    results["equalize_hist"] = measure(lambda: gray_image(img), repeat)
+    state.gray = gray_image(img)
+    results["canny"] = measure(
+        lambda: CannyEngine(state.gray).index(
+            state.lower_threshold, state.upper_threshold
+        ),
+        repeat,
+    )
+    results["surface_build"] = measure(lambda: new_surface(img), repeat)
+    results["update_edges_and_pixbuf"] = measure(
+        lambda: update_edges_and_pixbuf(state), repeat
+    )
+
+    # Threshold changes on an engine that already has its first map
+    thresholds = iter(range(10**9))
+
+    def rethreshold():
+        lower = next(thresholds) % 60
+        state.canny.index(lower, lower + 20)
+
+    results["canny_rethreshold"] = measure(rethreshold, repeat)
+
+    cursors = iter(
+        [int(x), int(y)]
+        for x, y in zip(
+            rng.integers(0, width, positions * 2),
+            rng.integers(0, height, positions * 2),
+        )
+    )
+
+    def lines():
+        state.cursor_pos = next(cursors)
+        update_lines(state)
+
+    results["update_lines"] = measure(lines, positions - 1)
+
+    state.cursor_pos = [width // 2, height // 2]
+    update_lines(state)
+    target = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+    cr = cairo.Context(target)
+    results["on_draw"] = measure(
+        lambda: ScreenCaptureWindow.on_draw(state, None, cr), repeat
+    )
+    return {f"{name}/{stage}": result for stage, result in results.items()}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change of every median against baseline, True on regression."""
+    regressed = False
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        ratio = result["median_ms"] / max(old["median_ms"], 1e-9)
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        print(
+            f"{key:45} {old['median_ms']:10.3f} -> "
+            f"{result['median_ms']:10.3f} ms  x{ratio:.2f}{flag}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pixruler hot paths.")
+    parser.add_argument(
+        "--resolution",
+        action="append",
+        choices=RESOLUTIONS,
+        help="resolutions to run, all of them by default",
+    )
+    parser.add_argument(
+        "--image", action="append", default=[], help="real image to include"
+    )
+    parser.add_argument("--repeat", type=int, default=20, help="runs per stage")
+    parser.add_argument(
+        "--positions", type=int, default=500, help="cursor positions for lines"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed median slowdown before --compare fails (0.1 = 10%%)",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(SEED)
+    results = {}
+    for resolution in args.resolution or RESOLUTIONS:
+        width, height = RESOLUTIONS[resolution]
+        images = {
+            "synthetic": synthetic_image(width, height, rng),
+            "ui": ui_image(width, height, rng),
+        }
+        for path in args.image:
+            bgr = cv2.resize(cv2.imread(path), (width, height))
+            images[os.path.basename(path)] = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        for name, rgb in images.items():
+            for key, result in bench_image(
+                f"{resolution}/{name}", rgb, args.repeat, args.positions
+            ).items():
+                results[key] = result
+                print(
+                    f"{key:45} median {result['median_ms']:10.3f} ms  "
+                    f"p99 {result['p99_ms']:10.3f} ms  "
+                    f"peak {result['peak_mib']:8.1f} MiB",
+                    flush=True,
+                )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": metadata(), "results": results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
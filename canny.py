@@ -0,0 +1,166 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# canny.py
+# contains the threshold engine used for edge detection. It splits cv2.Canny
+# into the threshold independent part (Sobel gradients and non-maximum
+# suppression), computed once per image on the first threshold change, and
+# the hysteresis step, which is the only part redone when the lower or upper
+# threshold changes. Edge maps are kept in a small LRU keyed by
+# (lower, upper) so scrubbing the thresholds back and forth does not
+# recompute anything. For the images passed as arguments the maps are also
+# persisted in the DiskCache (disk_cache.py) for the next time, only the one
+# shown when the image is left rather than every one scrolled past.
+
+from collections import OrderedDict
+import numpy as np
+from edge_index import EdgeIndex
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Memory budget for the cached edge maps and indexes and the suppression
+# candidates of an image, the last two maps are kept whatever their size
+CACHE_BYTES = 128 * 1024 * 1024
+# tan(22.5deg) in the same 15 bit fixed point used by cv2.Canny
+TG22 = 13573
+CANNY_SHIFT = 15
+
+
+class CannyEngine:
+
+    def __init__(self, gray, disk_cache=None):
+        self.gray = gray
+        # DiskCache of the image the gray map is from, if it is persisted
+        self.disk_cache = disk_cache
+        self.shape = gray.shape
+        self.candidates = None
+        self.candidate_mag = None
+        self.cache = OrderedDict()
+        self.cache_bytes = 0
+        # Thresholds whose maps are in the disk cache already
+        self.saved = set()
+
+    def index(self, lower, upper, cursor_pos=None):
+        """Return the EdgeIndex for the edge map of the given thresholds.
+
+        cursor_pos is where the lines are looked up first, only TiledCanny
+        makes use of it.
+        """
+        key = (lower, upper)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        edge_index = None
+        if self.disk_cache is not None:
+            edge_index = self.disk_cache.load_index(lower, upper, self.shape)
+        if edge_index is None:
+            edge_index = self.compute(lower, upper)
+        else:
+            self.saved.add(key)
+        self.cache[key] = edge_index
+        self.cache_bytes += edge_index.nbytes
+        while len(self.cache) > 2 and self.nbytes > CACHE_BYTES:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.nbytes
+        return edge_index
+
+    def persist(self, thresholds=None):
+        """Write the maps of thresholds to the disk cache, all cached ones
+        by default. Maps evicted from the memory cache are skipped."""
+        if self.disk_cache is None:
+            return
+        for key in list(self.cache) if thresholds is None else thresholds:
+            if key in self.cache and key not in self.saved:
+                self.saved.add(key)
+                self.disk_cache.save_index(*key, self.cache[key])
+
+    @property
+    def nbytes(self):
+        """Memory held by the cached indexes and the candidates."""
+        total = self.cache_bytes
+        if self.candidates is not None:
+            total += self.candidates.nbytes + self.candidate_mag.nbytes
+        return total
+
+    def compute(self, lower, upper):
+        if not self.cache:
+            # The first map of an image is needed before the first frame, a
+            # plain cv2.Canny is cheaper than setting up the suppression
+            return EdgeIndex(cv2.Canny(self.gray, lower, upper))
+        flat = self.hysteresis(lower, upper)
+        edges = np.zeros(self.shape, dtype=np.uint8)
+        edges.ravel()[flat] = 255
+        return EdgeIndex(edges, flat)
+
+    def edges(self, lower, upper):
+        return self.index(lower, upper).edges
+
+    def hysteresis(self, lower, upper):
+        """Flat indices of the candidates 8-connected to a strong one."""
+        if self.candidates is None:
+            # Only the local maxima can ever become edges, keep them sparse
+            magnitude = suppressed_magnitude(self.gray).ravel()
+            self.candidates = np.flatnonzero(magnitude)
+            self.candidate_mag = magnitude[self.candidates]
+        if lower > upper:
+            lower, upper = upper, lower
+        weak = self.candidate_mag > int(np.floor(lower))
+        weak_idx = self.candidates[weak]
+        weak_mag = self.candidate_mag[weak]
+        weak_map = np.zeros(self.shape, dtype=np.uint8)
+        weak_map.ravel()[weak_idx] = 1
+        count, labels = cv2.connectedComponents(
+            weak_map, connectivity=8, ltype=cv2.CV_32S
+        )
+        weak_labels = labels.ravel()[weak_idx]
+        keep = np.zeros(count, dtype=bool)
+        keep[weak_labels[weak_mag > int(np.floor(upper))]] = True
+        return weak_idx[keep[weak_labels]]
+
+
+def suppressed_magnitude(gray):
+    """L1 gradient magnitude with non-maxima zeroed, as cv2.Canny computes it."""
+    dx = cv2.Sobel(gray, cv2.CV_16S, 1, 0, ksize=3, borderType=cv2.BORDER_REPLICATE)
+    dy = cv2.Sobel(gray, cv2.CV_16S, 0, 1, ksize=3, borderType=cv2.BORDER_REPLICATE)
+    # |d| <= 1020 for a 3x3 Sobel, so all the fixed point math fits in int32
+    ax = np.abs(dx).astype(np.int32)
+    ay = np.abs(dy).astype(np.int32)
+    mag = ax + ay
+    # Neighbours outside the image count as zero magnitude
+    padded = np.pad(mag, 1)
+    height, width = mag.shape
+
+    def neighbour(oy, ox):
+        return padded[1 + oy : 1 + oy + height, 1 + ox : 1 + ox + width]
+
+    tg22x = ax * TG22
+    ay <<= CANNY_SHIFT
+    horizontal = ay < tg22x
+    ax <<= CANNY_SHIFT + 1
+    tg22x += ax
+    vertical = ay > tg22x
+    vertical &= ~horizontal
+    diagonal = ~(horizontal | vertical)
+    # Gradient signs differ: the edge runs from bottom-left to top-right
+    anti = (dx ^ dy) < 0
+
+    is_max = horizontal & (mag > neighbour(0, -1)) & (mag >= neighbour(0, 1))
+    is_max |= vertical & (mag > neighbour(-1, 0)) & (mag >= neighbour(1, 0))
+    is_max |= diagonal & anti & (mag > neighbour(-1, 1)) & (mag > neighbour(1, -1))
+    is_max |= diagonal & ~anti & (mag > neighbour(-1, -1)) & (mag > neighbour(1, 1))
+    mag[~is_max] = 0
+    return mag
@@ -0,0 +1,75 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# capture.py
+# contains the screen capture backend. mss is used directly with one capture
+# context kept for the whole session; its BGRA output already is the layout
+# pixruler works in, so the pixels are wrapped without any conversion.
+# pyscreenshot, which probes backends and may spawn helper processes, is
+# only used when mss is not available or cannot grab the screen.
+
+import time
+import numpy as np
+
+try:
+    import mss
+    from mss.exception import ScreenShotError
+except ImportError:
+    mss = None
+
+_sct = None
+# Duration of the last grab_screen call in seconds
+last_capture_time = None
+
+
+def _mss_grab(monitor):
+    global _sct
+    if _sct is None:
+        _sct = mss.mss()
+    # monitors[0] spans all monitors, the others follow in the GDK order
+    shot = _sct.grab(_sct.monitors[0 if monitor is None else monitor + 1])
+    return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+
+
+def _pyscreenshot_grab(bbox):
+    import pyscreenshot
+
+    # Let PIL pack the RGB image straight into BGRX
+    shot = pyscreenshot.grab(bbox=bbox).convert("RGB")
+    return np.frombuffer(bytearray(shot.tobytes("raw", "BGRX")), np.uint8).reshape(
+        shot.height, shot.width, 4
+    )
+
+
+def grab_screen(monitor=None, bbox=None):
+    """Capture a monitor as a BGRA array, the whole screen if monitor is None.
+
+    monitor is the GDK index of the monitor, bbox its (x0, y0, x1, y1) in
+    screen pixels for the backends that cannot address monitors.
+    """
+    global last_capture_time
+    start = time.perf_counter()
+    img = None
+    if mss is not None:
+        try:
+            img = _mss_grab(monitor)
+        except ScreenShotError:
+            # e.g. Wayland sessions without XWayland access
+            pass
+    if img is None:
+        img = _pyscreenshot_grab(bbox)
+    last_capture_time = time.perf_counter() - start
+    return img
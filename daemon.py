@@ -0,0 +1,226 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# daemon.py
+# contains the measurement daemon. It keeps images, their edge engines and
+# edge indexes loaded and answers measurement queries over a Unix domain
+# socket, so scripts do not pay for the image loading and the edge detection
+# on every query. Clients send one JSON object per line and get one back:
+#
+#   {"op": "measure", "image": "shot.png", "points": [[x, y], ...]}
+#   {"op": "thresholds", "lower": 40, "upper": 90}
+#   {"op": "close", "image": "shot.png"}
+#
+# measure answers with the y, -y, -x and x line lengths and the Y and X
+# totals of every point, as measure.py prints them, for the thresholds of
+# the connection (50 and 70 until changed) or the lower and upper of the
+# query. Connections are served concurrently by asyncio with the loading
+# and the edge detection in worker threads, and every image is loaded once
+# however many connections use it, until the last one closes it.
+#
+# usage: python daemon.py [--socket PATH]
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import numpy as np
+from imaging import load_image, edge_engine
+from measure import FIELDS, measure_points
+
+# Longest request line, a few hundred thousand points
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+def default_socket():
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "pixruler.sock")
+    return f"/tmp/pixruler-{os.getuid()}.sock"
+
+
+class Resident:
+    """An image kept loaded for the connections using it."""
+
+    def __init__(self, path):
+        self.img = load_image(path)
+        self.height, self.width = self.img.shape[:2]
+        _, self.canny = edge_engine(self.img, persist=True)
+        # Edge engines are not thread safe, the indexes they return are
+        self.lock = threading.Lock()
+
+    def measure(self, points, lower, upper):
+        xs, ys = points[:, 0], points[:, 1]
+        outside = (xs < 0) | (ys < 0) | (xs >= self.width) | (ys >= self.height)
+        if outside.any():
+            x, y = points[np.argmax(outside)]
+            raise ValueError(f"probe point ({x}, {y}) is outside the image")
+        with self.lock:
+            edge_index = self.canny.index(lower, upper)
+        return measure_points(edge_index, xs, ys)
+
+
+class ImageStore:
+    """Residents shared by all connections, keyed by file and modification."""
+
+    def __init__(self):
+        # key -> future of the Resident, done once it is loaded, and the
+        # number of connections holding it
+        self.residents = {}
+        self.refs = {}
+
+    @staticmethod
+    def key(path):
+        stat = os.stat(path)
+        return (os.path.realpath(path), stat.st_mtime_ns, stat.st_size)
+
+    async def acquire(self, path):
+        key = self.key(path)
+        if key not in self.residents:
+            # Connections asking while it loads wait on the same future
+            loop = asyncio.get_running_loop()
+            self.residents[key] = loop.run_in_executor(None, Resident, path)
+        # Counted before the wait so a release meanwhile does not drop it
+        self.refs[key] = self.refs.get(key, 0) + 1
+        try:
+            resident = await asyncio.shield(self.residents[key])
+        except BaseException:
+            self.release(key)
+            raise
+        return key, resident
+
+    def release(self, key):
+        self.refs[key] -= 1
+        if self.refs[key] == 0:
+            del self.refs[key]
+            future = self.residents.pop(key)
+            if future.done() and future.exception() is None:
+                # The maps still in memory go to the disk cache as it unloads
+                resident = future.result()
+                with resident.lock:
+                    resident.canny.persist()
+
+
+class Connection:
+
+    def __init__(self, store):
+        self.store = store
+        self.lower = 50
+        self.upper = 70
+        # Path as given by the client -> (store key, Resident)
+        self.images = {}
+
+    async def image(self, path):
+        if path not in self.images:
+            self.images[path] = await self.store.acquire(path)
+        return self.images[path][1]
+
+    async def handle(self, request):
+        op = request.get("op")
+        if op == "thresholds":
+            self.lower = int(request.get("lower", self.lower))
+            self.upper = int(request.get("upper", self.upper))
+            return {"lower": self.lower, "upper": self.upper}
+        if op == "measure":
+            resident = await self.image(request["image"])
+            points = np.array(request["points"], dtype=np.int64).reshape(-1, 2)
+            lower = int(request.get("lower", self.lower))
+            upper = int(request.get("upper", self.upper))
+            loop = asyncio.get_running_loop()
+            lengths = await loop.run_in_executor(
+                None, resident.measure, points, lower, upper
+            )
+            return {
+                "lengths": [
+                    {name: int(lengths[name][i]) for name in FIELDS[3:]}
+                    for i in range(len(points))
+                ]
+            }
+        if op == "close":
+            if request["image"] in self.images:
+                key, _ = self.images.pop(request["image"])
+                self.store.release(key)
+            return {}
+        raise ValueError(f"unknown op {op!r}")
+
+    def close(self):
+        for key, _ in self.images.values():
+            self.store.release(key)
+        self.images = {}
+
+
+async def serve(reader, writer, store):
+    connection = Connection(store)
+    try:
+        while line := await reader.readline():
+            try:
+                response = await connection.handle(json.loads(line))
+            except Exception as e:
+                # A bad request, or an image that cannot be read, is answered
+                # and the connection kept
+                response = {"error": str(e) or type(e).__name__}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+        pass
+    finally:
+        connection.close()
+        writer.close()
+
+
+async def run(path):
+    store = ImageStore()
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: serve(reader, writer, store), path, limit=LINE_LIMIT
+    )
+    print(f"pixruler daemon listening on {path}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve pixruler measurements over a Unix domain socket."
+    )
+    parser.add_argument(
+        "--socket", default=default_socket(), help="socket path to listen on"
+    )
+    args = parser.parse_args()
+    if os.path.exists(args.socket):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(args.socket)
+        except ConnectionRefusedError:
+            # Left behind by a daemon that did not exit cleanly
+            os.unlink(args.socket)
+        else:
+            sys.exit(f"pixruler daemon already running on {args.socket}")
+        finally:
+            probe.close()
+    try:
+        asyncio.run(run(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# derived.py
+# contains the worker building the lookup structures derived from an edge
+# map, the snap targets (snap.py) and the elements (elements.py). They are
+# built once per edge map off the main thread, rebuild_derived in utils.py
+# queues them whenever the edges change.
+
+from concurrent.futures import ThreadPoolExecutor
+from tiles import TiledEdgeIndex
+from profiler import span
+
+# A single worker, builds for edges replaced in the meantime are cancelled
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pixruler-derived")
+
+
+def _build(name, build, edges):
+    with span(name):
+        return build(edges())
+
+
+def build_derived(name, edge_index, build):
+    """Future of build(edges) for the edges of edge_index, run on the worker.
+
+    The build is recorded as a profiler span called name.
+    """
+    if isinstance(edge_index, TiledEdgeIndex):
+        # Tiled edge maps are only filled in where they were looked at
+        return _executor.submit(_build, name, build, edge_index.complete)
+    # Live mode updates the edges in place, the worker needs them as they are
+    edges = edge_index.edges.copy()
+    return _executor.submit(_build, name, build, lambda: edges)
@@ -0,0 +1,138 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# disk_cache.py
+# contains the on-disk cache of the edge processing of the images passed as
+# arguments, so opening the same screenshots again skips the equalization
+# and Canny. Entries are keyed by a hash of the decoded pixels: the gray map
+# is stored as it is, and every edge map bit packed along with the arrays of
+# its EdgeIndex, each as an .npy file that is memory mapped on a hit instead
+# of read. The files are written on a background worker, which also deletes
+# the least recently used ones once the directory grows past CACHE_BYTES.
+
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from edge_index import EdgeIndex
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "pixruler"
+)
+CACHE_BYTES = 1024 * 1024 * 1024
+
+# A single worker keeps the writes and the evictions from racing each other
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pixruler-disk-cache")
+
+
+def content_key(img):
+    # SHA-1 is hardware accelerated on most CPUs, about 25ms for a 4K frame
+    digest = hashlib.sha1(repr(img.shape).encode(), usedforsecurity=False)
+    digest.update(np.ascontiguousarray(img))
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """The cached files of one image."""
+
+    def __init__(self, key, directory=CACHE_DIR, limit=CACHE_BYTES):
+        self.directory = directory
+        self.prefix = os.path.join(directory, key)
+        self.limit = limit
+
+    def path(self, name):
+        return f"{self.prefix}.{name}.npy"
+
+    def load(self, name):
+        """Memory mapped array, None when it is not cached."""
+        path = self.path(name)
+        try:
+            array = np.load(path, mmap_mode="r")
+            # The modification time orders the eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return array
+
+    def save(self, name, array):
+        self.submit(lambda: {name: array})
+
+    def load_index(self, lower, upper, shape):
+        """EdgeIndex of the thresholds, None unless all its files are cached."""
+        name = f"{lower:g}-{upper:g}"
+        packed = self.load(f"{name}.edges")
+        arrays = [self.load(f"{name}.{field}") for field in EdgeIndex.ARRAYS]
+        if packed is None or any(array is None for array in arrays):
+            return None
+        edges = np.unpackbits(packed, axis=1, count=shape[1])
+        edges *= 255
+        return EdgeIndex.from_arrays(edges, dict(zip(EdgeIndex.ARRAYS, arrays)))
+
+    def save_index(self, lower, upper, edge_index):
+        name = f"{lower:g}-{upper:g}"
+
+        def arrays():
+            # Edge maps are never modified once indexed, pack them on the worker
+            arrays = {f"{name}.edges": np.packbits(edge_index.edges > 0, axis=1)}
+            # Positions and keys are below the pixel count, half the size as int32
+            narrow = edge_index.edges.size < 2**31
+            for field in EdgeIndex.ARRAYS:
+                array = getattr(edge_index, field)
+                arrays[f"{name}.{field}"] = array.astype(np.int32) if narrow else array
+            return arrays
+
+        self.submit(arrays)
+
+    def submit(self, arrays):
+        # arrays() runs on the worker and returns {name: array} to write
+        future = _writer.submit(self.write, arrays)
+        future.add_done_callback(_report_error)
+
+    def write(self, arrays):
+        os.makedirs(self.directory, exist_ok=True)
+        for name, array in arrays().items():
+            path = self.path(name)
+            # Readers never see a partly written file
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                np.save(f, array)
+            os.replace(temporary, path)
+        evict(self.directory, self.limit)
+
+
+def evict(directory, limit):
+    """Delete the least recently used files until the rest fit in limit."""
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".npy"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        # Mappings of files already loaded stay valid after the unlink
+        os.unlink(path)
+        total -= size
+
+
+def _report_error(future):
+    if future.exception() is not None:
+        print(
+            f"pixruler: writing the disk cache failed: {future.exception()}",
+            file=sys.stderr,
+        )
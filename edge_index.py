@@ -0,0 +1,184 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# edge_index.py
+# contains the edge index used to find the nearest edge along the four
+# axis-aligned rays from the cursor. The edge pixels of every row and column
+# are stored as sorted position lists (CSR layout), so a ray lookup is a
+# binary search instead of a walk over the pixels of the ray.
+
+import numpy as np
+from rays import cast_rays
+
+
+class EdgeIndex:
+
+    # The arrays making up the index, as stored by DiskCache
+    ARRAYS = ("row_xs", "row_ptr", "col_ys", "col_ptr", "row_keys", "col_keys")
+
+    def __init__(self, edges, flat=None):
+        self.edges = edges
+        self.height, self.width = edges.shape
+        # Flat indices of the edge pixels in row-major order, callers that
+        # already have them can pass them in to skip the scan
+        if flat is None:
+            flat = np.flatnonzero(edges)
+        ys, xs = np.divmod(flat, self.width)
+        self.row_xs = xs
+        self.row_ptr = np.searchsorted(ys, np.arange(self.height + 1))
+        # A stable sort by x keeps the y positions of each column sorted
+        order = np.argsort(xs, kind="stable")
+        self.col_ys = ys[order]
+        self.col_ptr = np.searchsorted(xs[order], np.arange(self.width + 1))
+        # Sorted (line, position) keys for the vectorized lookups
+        self.row_keys = flat
+        self.col_keys = xs[order] * self.height + self.col_ys
+
+    @classmethod
+    def from_arrays(cls, edges, arrays):
+        """Rebuild an index from its ARRAYS without scanning edges again."""
+        index = cls.__new__(cls)
+        index.edges = edges
+        index.height, index.width = edges.shape
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        return index
+
+    @property
+    def nbytes(self):
+        """Memory held by the edge map and the index arrays."""
+        arrays = sum(getattr(self, name).nbytes for name in self.ARRAYS)
+        return self.edges.nbytes + arrays
+
+    def row(self, y):
+        return self.row_xs[self.row_ptr[y] : self.row_ptr[y + 1]]
+
+    def column(self, x):
+        return self.col_ys[self.col_ptr[x] : self.col_ptr[x + 1]]
+
+    def line_endpoints(self, cursor_pos):
+        """Return the up, down, left and right ray endpoints for the cursor."""
+        x, y = cursor_pos
+        if self.edges[y, x] > 0:
+            return [(x, y)] * 4
+        column = self.column(x)
+        row = self.row(y)
+        return [
+            (x, _search_backward(column, y)),
+            (x, _search_forward(column, y, self.height)),
+            (_search_backward(row, x), y),
+            (_search_forward(row, x, self.width), y),
+        ]
+
+    def ray_endpoints(self, cursor_pos, angles):
+        """Return the endpoints of rays at any angles, see rays.py."""
+        return cast_rays(self.edges, cursor_pos, angles)
+
+    def line_endpoints_many(self, xs, ys):
+        """Vectorized line_endpoints for arrays of cursor positions.
+
+        Returns the y of the up and down endpoints and the x of the left and
+        right endpoints, one array each.
+        """
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        col_base = xs * self.height
+        row_base = ys * self.width
+        up = _search_backward_many(self.col_keys, self.col_ys, col_base, ys)
+        down = _search_forward_many(
+            self.col_keys, self.col_ys, col_base, ys, self.height
+        )
+        left = _search_backward_many(self.row_keys, self.row_xs, row_base, xs)
+        right = _search_forward_many(
+            self.row_keys, self.row_xs, row_base, xs, self.width
+        )
+        on_edge = self.edges[ys, xs] > 0
+        for ends, pos in ((up, ys), (down, ys), (left, xs), (right, xs)):
+            ends[on_edge] = pos[on_edge]
+        return up, down, left, right
+
+
+class LiveEdgeIndex(EdgeIndex):
+    """EdgeIndex over an edge map that is updated in place.
+
+    Rows and columns are scanned when they are first looked up and cached
+    until refresh() is called for a region they cross, so an update only
+    costs as much as the part of the map that changed.
+    """
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.height, self.width = edges.shape
+        self.rows = {}
+        self.columns = {}
+
+    def row(self, y):
+        if y not in self.rows:
+            self.rows[y] = np.flatnonzero(self.edges[y])
+        return self.rows[y]
+
+    def column(self, x):
+        if x not in self.columns:
+            self.columns[x] = np.flatnonzero(self.edges[:, x])
+        return self.columns[x]
+
+    def refresh(self, y0, y1, x0, x1):
+        """Forget the rows and columns crossing edges[y0:y1, x0:x1]."""
+        for y in [y for y in self.rows if y0 <= y < y1]:
+            del self.rows[y]
+        for x in [x for x in self.columns if x0 <= x < x1]:
+            del self.columns[x]
+
+    def line_endpoints_many(self, xs, ys):
+        return EdgeIndex(self.edges).line_endpoints_many(xs, ys)
+
+
+# The per-pixel linspace walk update_lines used to do samples a ray of length
+# d with d points, so the step is slightly larger than one pixel and exactly
+# one pixel is never looked at: the one next to the cursor when walking towards 0 and
+# the one next to the border when walking towards the far side. The searches
+# below skip the same pixel so the endpoints stay identical.
+def _search_backward(positions, pos):
+    i = np.searchsorted(positions, pos - 1)
+    if pos >= 2 and i > 0:
+        return int(positions[i - 1])
+    return 0
+
+
+def _search_forward(positions, pos, size):
+    i = np.searchsorted(positions, pos + 1)
+    if i < len(positions) and positions[i] <= size - 3:
+        return int(positions[i])
+    return size - 1
+
+
+def _search_backward_many(keys, positions, base, pos):
+    if len(keys) == 0:
+        return np.zeros_like(pos)
+    i = np.searchsorted(keys, base + pos - 1)
+    prev = np.maximum(i - 1, 0)
+    # The key before the insertion point has to be on the same line
+    found = (pos >= 2) & (i > 0) & (keys[prev] >= base)
+    return np.where(found, positions[prev], 0)
+
+
+def _search_forward_many(keys, positions, base, pos, size):
+    if len(keys) == 0:
+        return np.full_like(pos, size - 1)
+    i = np.searchsorted(keys, base + pos + 1)
+    nxt = np.minimum(i, len(keys) - 1)
+    found = (i < len(keys)) & (keys[nxt] <= base + size - 3)
+    return np.where(found, positions[nxt], size - 1)
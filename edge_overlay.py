@@ -0,0 +1,67 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# edge_overlay.py
+# contains the edge overlay (E key): the current Canny edge map tinted over
+# the image, to see what the lines stop at while tuning the thresholds. It
+# is built with the other maps derived from the edges, once per edge map,
+# as premultiplied BGRA arrays wrapped by cairo surfaces without copying,
+# with halved levels like the image so zoomed out views paint a small one.
+# Only the level of the fitted view is tinted up front, a full resolution
+# tint is four bytes a pixel and only made once the view zooms in.
+
+import numpy as np
+import cairo
+from view import image_pyramid
+
+# Color and opacity of the edges, 0 to 1
+EDGE_TINT = (1, 0, 1)
+EDGE_ALPHA = 0.8
+
+# Edge map value (the share of edge pixels on halved levels) -> BGRA pixel
+_tint = np.zeros((256, 4), dtype=np.uint8)
+_tint[1:] = [round(255 * EDGE_ALPHA * c) for c in EDGE_TINT[::-1]] + [
+    round(255 * EDGE_ALPHA)
+]
+
+
+class EdgeOverlay:
+    """Tinted levels of an edge map, a sequence for paint_levels."""
+
+    def __init__(self, edges, min_scale=1):
+        self.shape = edges.shape
+        # What is tinted, live mode leaves it out when comparing captures
+        self.edges = edges
+        self.maps = image_pyramid(edges, min_scale)
+        self.levels = {}
+        # Kept alive along with the surfaces wrapping them
+        self.pixels = {}
+        # The level the fitted view paints
+        self[len(self.maps) - 1]
+
+    def __len__(self):
+        return len(self.maps)
+
+    def __getitem__(self, level):
+        if level not in self.levels:
+            # Any edge in a halved pixel keeps it, thin lines do not fade out
+            pixels = _tint[self.maps[level]]
+            height, width = self.maps[level].shape
+            self.pixels[level] = pixels
+            self.levels[level] = cairo.ImageSurface.create_for_data(
+                pixels, cairo.FORMAT_ARGB32, width, height, width * 4
+            )
+        return self.levels[level]
@@ -0,0 +1,87 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# elements.py
+# contains the element boxes (b key): the smallest box around the cursor
+# that is the outline of a group of connected edges, which on a screenshot
+# is usually a button, a field or a panel, is outlined with its width and
+# height like in the inspector of a browser. The bounding boxes of the
+# connected edges are extracted once per edge map and registered in a
+# uniform grid, stored like the edge index as sorted (cell, box) lists, so
+# hovering only looks at the few boxes registered in the cell under the
+# cursor.
+
+import numpy as np
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Image pixels per side of a grid cell
+GRID_CELL = 64
+# Boxes smaller than that along either side are taken for noise or text
+MIN_ELEMENT = 8
+
+
+class ElementIndex:
+
+    def __init__(self, edges):
+        height, width = edges.shape
+        _, _, stats, _ = cv2.connectedComponentsWithStats(edges, connectivity=8)
+        # Row 0 is the background
+        boxes = stats[1:, :4].astype(np.int64)
+        boxes = boxes[(boxes[:, 2] >= MIN_ELEMENT) & (boxes[:, 3] >= MIN_ELEMENT)]
+        self.boxes = boxes
+        self.areas = boxes[:, 2] * boxes[:, 3]
+        self.cols = -(-width // GRID_CELL)
+        rows = -(-height // GRID_CELL)
+        # Every box is registered in all the cells it overlaps
+        cx0 = boxes[:, 0] // GRID_CELL
+        cy0 = boxes[:, 1] // GRID_CELL
+        nx = (boxes[:, 0] + boxes[:, 2] - 1) // GRID_CELL - cx0 + 1
+        ny = (boxes[:, 1] + boxes[:, 3] - 1) // GRID_CELL - cy0 + 1
+        counts = nx * ny
+        ids = np.repeat(np.arange(len(boxes)), counts)
+        starts = np.cumsum(counts) - counts
+        offsets = np.arange(counts.sum()) - np.repeat(starts, counts)
+        cells = (
+            (cy0[ids] + offsets // nx[ids]) * self.cols + cx0[ids] + offsets % nx[ids]
+        )
+        order = np.argsort(cells, kind="stable")
+        self.cell_boxes = ids[order]
+        self.cell_ptr = np.searchsorted(cells[order], np.arange(rows * self.cols + 1))
+
+    def element_at(self, x, y):
+        """Smallest (x, y, width, height) box containing (x, y), or None."""
+        cell = (y // GRID_CELL) * self.cols + x // GRID_CELL
+        ids = self.cell_boxes[self.cell_ptr[cell] : self.cell_ptr[cell + 1]]
+        boxes = self.boxes[ids]
+        inside = (
+            (boxes[:, 0] <= x)
+            & (x < boxes[:, 0] + boxes[:, 2])
+            & (boxes[:, 1] <= y)
+            & (y < boxes[:, 1] + boxes[:, 3])
+        )
+        if not inside.any():
+            return None
+        ids = ids[inside]
+        return tuple(int(v) for v in self.boxes[ids[self.areas[ids].argmin()]])
+
+
+def update_element(self):
+    if self.element_index is None:
+        self.element = None
+        return
+    self.element = self.element_index.element_at(*self.cursor_pos)
@@ -0,0 +1,154 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# image_cache.py
+# contains the cache used when switching between the images passed as
+# arguments (n/N keys). The images around the current one are decoded and
+# edge processed by a small worker pool, and the prepared bundles are kept in
+# a memory bounded LRU so switching images is usually a cache hit.
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from imaging import load_image, edge_engine
+from utils import new_pyramid, is_video
+from view import fit_scale
+from profiler import timed
+
+# Memory budget for prepared images, the current one is never evicted
+CACHE_BYTES = 512 * 1024 * 1024
+# How many images on each side of the current one are prepared ahead
+PREFETCH_RADIUS = 2
+WORKERS = 2
+
+
+class ImageBundle:
+
+    def __init__(self, img, gray, canny, pyramid):
+        self.img = img
+        self.gray = gray
+        self.canny = canny
+        self.pyramid = pyramid
+        self.image_nbytes = sum(s.get_stride() * s.get_height() for s in pyramid)
+        if gray is not None:
+            self.image_nbytes += gray.nbytes
+
+    @property
+    def nbytes(self):
+        # The edge maps cached by the engine grow as the thresholds change
+        return self.image_nbytes + self.canny.nbytes
+
+
+@timed
+def load_bundle(path, width, height, lower, upper, cursor_pos=None, persist=True):
+    return prepare_bundle(
+        load_image(path), width, height, lower, upper, persist, cursor_pos
+    )
+
+
+def prepare_bundle(img, width, height, lower, upper, persist=False, cursor_pos=None):
+    # Native resolution, width and height are the window size the mipmap
+    # levels are made for, persist keeps the edge maps in the disk cache
+    gray, canny = edge_engine(img, persist)
+    # Warm the edge map for the thresholds in use when the job was queued,
+    # tiled images are filled in starting around the cursor
+    canny.index(lower, upper, cursor_pos)
+    return ImageBundle(
+        img, gray, canny, new_pyramid(img, fit_scale(img, (width, height)))
+    )
+
+
+class ImageCache:
+
+    def __init__(self, paths, width, height, persist=True):
+        self.paths = paths
+        self.width = width
+        self.height = height
+        # Whether the edge maps go through the disk cache, see disk_cache.py
+        self.persist = persist
+        self.bundles = OrderedDict()
+        self.pending = {}
+        self.current = None
+        self.executor = ThreadPoolExecutor(
+            max_workers=WORKERS, thread_name_prefix="pixruler-prefetch"
+        )
+
+    def get(self, index, lower, upper, cursor_pos=None):
+        """Return the bundle for paths[index], waiting on or loading it."""
+        self.current = index
+        if index in self.bundles:
+            self.bundles.move_to_end(index)
+            return self.bundles[index]
+        future = self.pending.pop(index, None)
+        if future is not None:
+            bundle = future.result()
+        else:
+            bundle = load_bundle(
+                self.paths[index],
+                self.width,
+                self.height,
+                lower,
+                upper,
+                cursor_pos,
+                self.persist,
+            )
+        self.store(index, bundle)
+        return bundle
+
+    def prefetch(self, index, lower, upper, cursor_pos=None):
+        """Queue the images around index that are not prepared yet."""
+        # Collect finished jobs first so they count towards the budget
+        for i, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[i]
+                if future.exception() is None:
+                    self.store(i, future.result())
+        wanted = set()
+        for distance in range(1, PREFETCH_RADIUS + 1):
+            for i in (index + distance, index - distance):
+                # paths is sys.argv, so paths[0] is the script itself
+                if 1 <= i < len(self.paths):
+                    wanted.add(i)
+        # Drop queued jobs that fell out of the window before they start
+        for i in list(self.pending):
+            if i not in wanted and self.pending[i].cancel():
+                del self.pending[i]
+        for i in sorted(wanted, key=lambda i: abs(i - index)):
+            # Videos are streamed by their VideoSource instead
+            if i in self.bundles or i in self.pending or is_video(self.paths[i]):
+                continue
+            self.pending[i] = self.executor.submit(
+                load_bundle,
+                self.paths[i],
+                self.width,
+                self.height,
+                lower,
+                upper,
+                cursor_pos,
+                self.persist,
+            )
+
+    def store(self, index, bundle):
+        if index in self.bundles:
+            return
+        self.bundles[index] = bundle
+        # Summed again every time, the bundles grow after they are stored
+        nbytes = sum(bundle.nbytes for bundle in self.bundles.values())
+        for i in list(self.bundles):
+            if nbytes <= CACHE_BYTES:
+                break
+            if i == self.current:
+                continue
+            nbytes -= self.bundles.pop(i).nbytes
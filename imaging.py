@@ -0,0 +1,60 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# imaging.py
+# contains the image loading and the choice of edge engine for an image,
+# shared by the window and the headless tools (measure.py, daemon.py). It
+# imports nothing of GTK or cairo, so measuring needs neither installed.
+
+from canny import CannyEngine
+from tiles import TiledCanny, TILED_PIXELS
+from disk_cache import DiskCache, content_key
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+
+def load_image(path, screen_width=None, screen_height=None):
+    # Images are kept in BGRA, the memory layout of a cairo RGB24 surface on
+    # little endian machines, so they can be drawn without a conversion
+    img = cv2.imread(path)
+    if img is None:
+        raise OSError(f"could not read {path} as an image")
+    if screen_width is not None and img.shape[:2] != (screen_height, screen_width):
+        img = cv2.resize(img, (screen_width, screen_height))
+    return cv2.cvtColor(img, cv2.COLOR_BGR2BGRA)
+
+
+def gray_image(img):
+    # Convert the image to grayscale & Enhance contrast using histogram equalization
+    return cv2.equalizeHist(cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY))
+
+
+def edge_engine(img, persist=False):
+    # Very large images are equalized and edge detected tile by tile, lazily
+    # and in parallel, so there is no full-size gray map for them
+    if img.shape[0] * img.shape[1] > TILED_PIXELS:
+        return None, TiledCanny(img)
+    if not persist:
+        gray = gray_image(img)
+        return gray, CannyEngine(gray)
+    # Images that are opened again load their maps from the disk cache
+    disk_cache = DiskCache(content_key(img))
+    gray = disk_cache.load("gray")
+    if gray is None:
+        gray = gray_image(img)
+        disk_cache.save("gray", gray)
+    return gray, CannyEngine(gray, disk_cache)
@@ -0,0 +1,273 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# live.py
+# contains the live mode (--live). The window turns transparent so the
+# screen shows through it, and the screen is polled on a timer with the
+# overlay up. Only when something changed outside the overlay is the
+# overlay taken off the screen for the few frames of a capture, so it is
+# not measured along with the screen; a still screen does not flicker.
+# Changes only under the overlay are missed until something around it
+# changes too. Every capture is compared with the previous one in tiles,
+# and only the tiles that changed are equalized and edge detected again,
+# with a halo so the gradients at their borders are right. Only the rows
+# and columns of the edge index that cross them are dropped, so the work
+# per frame follows how much of the screen changed. The maps derived from
+# the edges cover the whole screen, they are built again once it settled.
+#
+# Equalization keeps the histogram of the last full frame for small changes,
+# the whole frame is processed again once more than FULL_FRACTION of it
+# changed. Between full passes the edges can drift from cv2.Canny of the
+# whole frame: hysteresis only sees HALO pixels around a changed region, so
+# a weak chain reaching a strong pixel farther out can come out wrong, and
+# such errors add up over frames. A full pass every FULL_EVERY partial
+# updates bounds how long they stay.
+
+import sys
+import numpy as np
+import cairo
+import gi
+import capture
+from capture import grab_screen
+from edge_index import LiveEdgeIndex
+from tiles import equalize_lut
+from lazy import lazy_import
+from utils import new_surface, update_edges, queue_update, monitor_bbox
+from utils import rebuild_derived, drop_derived, LINES, REDRAW
+from view import to_image
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+
+cv2 = lazy_import("cv2")
+
+# Milliseconds between polls of the screen
+LIVE_INTERVAL = 100
+# Milliseconds the screen has to stay unchanged before the derived maps are
+# built again
+SETTLE_DELAY = 300
+# Frames the overlay is hidden for before a capture, one to draw the window
+# without it and one for the compositor to show that
+HIDE_FRAMES = 2
+DIFF_TILE = 64
+# Pixels around a changed region Canny is run on, for the gradients and
+# for hysteresis chains crossing the region border
+HALO = 16
+# Sobel and the suppression reach 2 pixels, the edges that far outside a
+# changed region can change too
+REACH = 2
+FULL_FRACTION = 0.5
+# Partial updates between two full passes
+FULL_EVERY = 10
+
+
+def changed_tiles(previous, frame, tile=DIFF_TILE):
+    """Boolean grid of the tiles with at least one changed pixel."""
+    height, width = frame.shape[:2]
+    rows, cols = -(-height // tile), -(-width // tile)
+    diff = np.zeros((rows * tile, cols * tile), dtype=bool)
+    # One 32 bit compare per BGRA pixel
+    np.not_equal(
+        previous.view(np.uint32)[..., 0],
+        frame.view(np.uint32)[..., 0],
+        out=diff[:height, :width],
+    )
+    return diff.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+
+
+class LiveCanny:
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.thresholds = None
+        self.current = None
+        self.partial_updates = 0
+        self.equalize(frame)
+
+    def equalize(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY)
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        self.lut = equalize_lut(hist.astype(np.int64))
+        self.gray = cv2.LUT(gray, self.lut)
+
+    def index(self, lower, upper, cursor_pos=None):
+        """Return the LiveEdgeIndex for the thresholds, kept up to date."""
+        if self.current is None or self.thresholds != (lower, upper):
+            self.thresholds = (lower, upper)
+            self.current = LiveEdgeIndex(cv2.Canny(self.gray, lower, upper))
+        return self.current
+
+    def edges(self, lower, upper):
+        return self.index(lower, upper).edges
+
+    def update(self, frame):
+        """Take a new frame, return the (x0, y0, x1, y1) boxes that changed."""
+        height, width = frame.shape[:2]
+        if frame.shape != self.frame.shape:
+            mask = None
+        else:
+            mask = changed_tiles(self.frame, frame)
+            if not mask.any():
+                return []
+        self.frame = frame
+        if (
+            mask is None
+            or mask.mean() > FULL_FRACTION
+            or self.partial_updates >= FULL_EVERY
+        ):
+            self.partial_updates = 0
+            self.equalize(frame)
+            self.current = None
+            return [(0, 0, width, height)]
+
+        _, _, stats, _ = cv2.connectedComponentsWithStats(
+            mask.astype(np.uint8), connectivity=8
+        )
+        boxes = []
+        for x, y, w, h, _ in stats[1:]:
+            x0, y0 = x * DIFF_TILE, y * DIFF_TILE
+            x1 = min((x + w) * DIFF_TILE, width)
+            y1 = min((y + h) * DIFF_TILE, height)
+            gray = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.COLOR_BGRA2GRAY)
+            self.gray[y0:y1, x0:x1] = cv2.LUT(gray, self.lut)
+            boxes.append((x0, y0, x1, y1))
+        self.partial_updates += 1
+        # After all the gray updates, the halos may overlap other boxes
+        if self.current is not None:
+            for box in boxes:
+                self.redetect(box)
+        return boxes
+
+    def redetect(self, box):
+        x0, y0, x1, y1 = box
+        height, width = self.gray.shape
+        hx0, hy0 = max(x0 - HALO, 0), max(y0 - HALO, 0)
+        hx1, hy1 = min(x1 + HALO, width), min(y1 + HALO, height)
+        edges = cv2.Canny(self.gray[hy0:hy1, hx0:hx1], *self.thresholds)
+        wx0, wy0 = max(x0 - REACH, 0), max(y0 - REACH, 0)
+        wx1, wy1 = min(x1 + REACH, width), min(y1 + REACH, height)
+        self.current.edges[wy0:wy1, wx0:wx1] = edges[
+            wy0 - hy0 : wy1 - hy0, wx0 - hx0 : wx1 - hx0
+        ]
+        self.current.refresh(wy0, wy1, wx0, wx1)
+
+
+def start_live(self):
+    """Make the window transparent and start capturing, False if it cannot."""
+    screen = self.get_screen()
+    visual = screen.get_rgba_visual()
+    if visual is None or not screen.is_composited():
+        print("pixruler: live mode needs a compositing window manager", file=sys.stderr)
+        return False
+    self.set_visual(visual)
+    self.set_app_paintable(True)
+    self.gray = None
+    self.canny = LiveCanny(self.img)
+    update_edges(self)
+    self.pyramid = [new_surface(self.img)]
+    self.surface = self.pyramid[0]
+    self.live = GLib.timeout_add(LIVE_INTERVAL, live_tick, self)
+    return True
+
+
+def live_tick(self):
+    if self.overlay_hidden:
+        # A capture is under way
+        return GLib.SOURCE_CONTINUE
+    frame = grab_screen(self.monitor, monitor_bbox(self.monitor))
+    if not screen_changed(self, frame):
+        return GLib.SOURCE_CONTINUE
+    # The overlay is part of that frame, and the pixels under the lines are
+    # the ones measured, so it is hidden until a clean one is taken
+    self.overlay_hidden = True
+    self.hidden_frames = 0
+    if self.edge_overlay is not None:
+        # Tinted all over the window
+        self.queue_draw()
+    else:
+        self.queue_draw_region(cairo.Region(self.overlay_rects))
+    self.add_tick_callback(live_capture)
+    return GLib.SOURCE_CONTINUE
+
+
+def overlay_mask(self):
+    """Pixels of the screen the overlay is drawn over."""
+    mask = np.zeros(self.img.shape[:2], dtype=bool)
+    for rect in self.overlay_rects:
+        x0, y0 = to_image(self, rect.x, rect.y)
+        x1, y1 = to_image(self, rect.x + rect.width, rect.y + rect.height)
+        mask[y0 : y1 + 1, x0 : x1 + 1] = True
+    edge_overlay = self.edge_overlay
+    if edge_overlay is not None and edge_overlay.shape == mask.shape:
+        mask |= edge_overlay.edges > 0
+    return mask
+
+
+def screen_changed(self, frame):
+    """Whether frame differs from the last capture outside the overlay."""
+    previous = self.canny.frame
+    if frame.shape != previous.shape:
+        return True
+    changed = np.not_equal(
+        previous.view(np.uint32)[..., 0], frame.view(np.uint32)[..., 0]
+    )
+    changed[overlay_mask(self)] = False
+    return changed.any()
+
+
+def live_capture(self, frame_clock):
+    self.hidden_frames += 1
+    if self.hidden_frames < HIDE_FRAMES:
+        return GLib.SOURCE_CONTINUE
+    frame = grab_screen(self.monitor, monitor_bbox(self.monitor))
+    self.capture_time = capture.last_capture_time
+    self.overlay_hidden = False
+    if not frame.flags.writeable:
+        frame = frame.copy()
+    changed = self.canny.update(frame)
+    if changed:
+        self.img = frame
+        self.pyramid = [new_surface(frame)]
+        self.surface = self.pyramid[0]
+        update_edges(self, derived=False)
+        settle_derived(self)
+    # Brings the overlay back, around the new lines if they moved
+    queue_update(self, LINES if changed else REDRAW)
+    return GLib.SOURCE_REMOVE
+
+
+def settle_derived(self):
+    # Nothing is looked up in maps of the old screen, they are built again
+    # once it stopped changing instead of for every frame
+    drop_derived(self)
+    if self.settle_timer is not None:
+        GLib.source_remove(self.settle_timer)
+    self.settle_timer = GLib.timeout_add(SETTLE_DELAY, derived_settled, self)
+
+
+def derived_settled(self):
+    self.settle_timer = None
+    rebuild_derived(self)
+    return GLib.SOURCE_REMOVE
+
+
+def clear_window(cr):
+    # Let the live screen show through everywhere but the overlay
+    cr.save()
+    cr.set_operator(cairo.OPERATOR_SOURCE)
+    cr.set_source_rgba(0, 0, 0, 0)
+    cr.paint()
+    cr.restore()
@@ -0,0 +1,135 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# measure.py
+# contains the headless batch measurement entry point. It takes images and a
+# list of probe points and prints, for every point, the lengths of the four
+# lines pixruler would draw with the cursor there (y, -y, -x, x) and the
+# Y and X totals from the stats panel. No window or display is needed.
+#
+# usage: python measure.py points.csv image.png [image.png ...]
+
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from imaging import load_image, edge_engine
+
+FIELDS = ["image", "px", "py", "y", "-y", "-x", "x", "total_y", "total_x"]
+
+
+def read_points(path):
+    """Probe points from a JSON list or a CSV file of x,y rows."""
+    with open(path) as f:
+        if path.endswith(".json"):
+            points = [
+                (p["x"], p["y"]) if isinstance(p, dict) else tuple(p)
+                for p in json.load(f)
+            ]
+        else:
+            points = [
+                tuple(row[:2])
+                for row in csv.reader(f)
+                if row and row[0].strip().lstrip("-").isdigit()
+            ]
+    return np.array(points, dtype=np.int64).reshape(-1, 2)
+
+
+def measure_points(edge_index, xs, ys):
+    """Line lengths for every point, as on_draw computes them."""
+    up, down, left, right = edge_index.line_endpoints_many(xs, ys)
+    lengths = {
+        "y": ys - up,
+        "-y": down - ys,
+        "-x": xs - left,
+        "x": right - xs,
+    }
+    lengths["total_y"] = lengths["y"] + lengths["-y"]
+    lengths["total_x"] = lengths["-x"] + lengths["x"]
+    return lengths
+
+
+def measure_image(path, points, lower, upper, size):
+    img = load_image(path, *size)
+    height, width = img.shape[:2]
+    xs, ys = points[:, 0], points[:, 1]
+    outside = (xs < 0) | (ys < 0) | (xs >= width) | (ys >= height)
+    if outside.any():
+        x, y = points[np.argmax(outside)]
+        raise ValueError(f"{path}: probe point ({x}, {y}) is outside the image")
+    edge_index = edge_engine(img)[1].index(lower, upper)
+    return measure_points(edge_index, xs, ys)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure edge distances around probe points without a window."
+    )
+    parser.add_argument("points", help="CSV (x,y rows) or JSON list of points")
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--lower", type=int, default=50, help="lower threshold")
+    parser.add_argument("--upper", type=int, default=70, help="upper threshold")
+    parser.add_argument(
+        "--size",
+        help="resize images to WIDTHxHEIGHT first, lengths are then in "
+        "pixels of the resized image",
+    )
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--json", action="store_true", help="print JSON lines")
+    args = parser.parse_args()
+
+    size = (None, None)
+    if args.size:
+        size = tuple(int(v) for v in args.size.lower().split("x"))
+    points = read_points(args.points)
+
+    writer = None
+    if not args.json:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(FIELDS)
+    failed = False
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(measure_image, path, points, args.lower, args.upper, size)
+            for path in args.images
+        ]
+        for path, future in zip(args.images, futures):
+            # An unreadable image does not stop the others from being measured
+            try:
+                lengths = future.result()
+            except OSError as e:
+                print(f"{path}: {e}", file=sys.stderr)
+                failed = True
+                continue
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                failed = True
+                continue
+            for i, (x, y) in enumerate(points):
+                row = [path, int(x), int(y)]
+                row += [int(lengths[name][i]) for name in FIELDS[3:]]
+                if writer:
+                    writer.writerow(row)
+                else:
+                    print(json.dumps(dict(zip(FIELDS, row))))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
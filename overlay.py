@@ -0,0 +1,274 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# overlay.py
+# contains the layout of the measurement overlay (the four lines, their
+# labels and the stats panel) shared by on_draw and the damage tracking.
+# Instead of repainting the whole window on every change, the bounding boxes
+# of the overlay before and after the change are invalidated, so only those
+# parts of the screenshot are blitted again. Text is rendered once into
+# sprites, transparent surfaces kept in an LRU cache, so frames where the
+# labels and the stats did not change composite them instead of shaping the
+# text again, and the stats are only formatted when one of their values did.
+
+import functools
+import math
+import cairo
+import profiler
+from view import to_screen
+
+# Extra pixels around every box for antialiasing and font hinting
+DAMAGE_PADDING = 3
+
+# Label and stats row sprites kept, lengths come back as the cursor moves
+TEXT_CACHE_SIZE = 512
+# Stats panels kept, one per combination of values
+STATS_CACHE_SIZE = 16
+
+# Scratch context used to measure text outside of on_draw
+_measure = cairo.Context(cairo.ImageSurface(cairo.FORMAT_A8, 1, 1))
+
+
+def measure_lines(cursor_pos, line_endpoints, line_angles=None):
+    """Name and length of every line plus the Y and X totals, as drawn."""
+    lines = []
+    total_len_y = 0
+    total_len_x = 0
+    line_name = "INITIALIZE"
+    start = cursor_pos
+    for i, end in enumerate(line_endpoints):
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if start[0] == end[0]:  # Vertical line
+            line_name = "-y" if start[1] < end[1] else "y"
+            total_len_y += length
+        elif start[1] == end[1]:  # Horizontal line
+            line_name = "x" if start[0] < end[0] else "-x"
+            total_len_x += length
+        if line_angles is not None:
+            # Rays are named after their angle
+            line_name = f"{line_angles[i]:.4g}°"
+        lines.append((line_name, length))
+    return lines, total_len_y, total_len_x
+
+
+def line_label_pos(self, end):
+    x0, y0 = to_screen(self, *self.cursor_pos)
+    x1, y1 = to_screen(self, *end)
+    return (
+        (x0 + x1) // 2 + self.offset[0],
+        (y0 + y1) // 2 + self.offset[1],
+    )
+
+
+def show_label(self, length):
+    # Only label lines that are long enough on the screen
+    return length * self.view_scale > self.TEXT_DISPLAY_THRESHOLD + self.font_size
+
+
+def element_layout(self):
+    """Window box, label and label position of the element outlined, or None."""
+    if not self.show_elements or self.element is None:
+        return None
+    x, y, width, height = self.element
+    x0, y0 = to_screen(self, x, y)
+    x1, y1 = to_screen(self, x + width, y + height)
+    # Above the box, below it when that would be off the window
+    label_y = y0 - 4 if y0 > self.font_size + 4 else y1 + self.font_size + 4
+    return (x0, y0, x1, y1), f"{width} x {height}", (x0, label_y)
+
+
+def stats_values(self, lines, total_len_y, total_len_x):
+    """Everything the stats panel shows, compared before it is formatted."""
+    return (
+        tuple((name, round(length)) for name, length in lines),
+        tuple(self.cursor_pos),
+        round(total_len_y),
+        round(total_len_x),
+        self.lower_threshold,
+        self.upper_threshold,
+        self.step_size_mp,
+        self.step_size,
+        self.is_live_colors,
+        self.snap_mode,
+        self.show_elements,
+        self.element,
+        None if self.capture_time is None else round(self.capture_time * 1000),
+        tuple(profiler.stats_lines(self.events_received, self.frames_computed)),
+        None if self.video is None else (self.frame_index + 1, self.video.frame_count),
+    )
+
+
+def stats_text(values):
+    """Stats panel rows as (row, text), row n is drawn n * font size down."""
+    (
+        lines,
+        cursor_pos,
+        total_len_y,
+        total_len_x,
+        lower_threshold,
+        upper_threshold,
+        step_size_mp,
+        step_size,
+        is_live_colors,
+        snap_mode,
+        show_elements,
+        element,
+        capture_ms,
+        profiler_lines,
+        frame,
+    ) = values
+    texts = [f"{name} ({length}px)" for name, length in lines]
+    texts += [
+        f"Cursor Position: {list(cursor_pos)}",
+        f"Total Length Y: {total_len_y}px",
+        f"Total Length X: {total_len_x}px",
+        f"Lower Threshold: {lower_threshold}",
+        f"Upper Threshold: {upper_threshold}",
+        f"Step Size: {step_size_mp}",
+        f"Step Size with Multiplier: {step_size}",
+        f"Live Color: {is_live_colors}",
+        f"Snap: {snap_mode or 'off'}",
+    ]
+    if show_elements:
+        if element is None:
+            texts.append("Element: none")
+        else:
+            texts.append(f"Element: {element[2]}x{element[3]}px")
+    if capture_ms is not None:
+        texts.append(f"Capture Time: {capture_ms}ms")
+    texts += profiler_lines
+    if frame is not None:
+        texts.append(f"Frame: {frame[0]}/{frame[1]}")
+    # Every other row, the panel grows with the number of rays
+    return tuple((i * 2, text) for i, text in enumerate(texts))
+
+
+def text_rect(text, font_size, x, y):
+    _measure.set_font_size(font_size)
+    x_bearing, y_bearing, width, height, _, _ = _measure.text_extents(text)
+    return (x + x_bearing, y + y_bearing, width, height)
+
+
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_sprite(text, font_size, color):
+    """Text rendered onto a transparent surface and the offset of its corner.
+
+    The offset is from the baseline start, where show_text would have drawn
+    the text, to the top left corner of the surface.
+    """
+    x, y, width, height = text_rect(text, font_size, 0, 0)
+    # A pixel more on every side for the antialiasing
+    x0, y0 = math.floor(x) - 1, math.floor(y) - 1
+    x1, y1 = math.ceil(x + width) + 1, math.ceil(y + height) + 1
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, x1 - x0, y1 - y0)
+    cr = cairo.Context(surface)
+    cr.set_source_rgb(*color)
+    cr.set_font_size(font_size)
+    cr.move_to(-x0, -y0)
+    cr.show_text(text)
+    surface.flush()
+    return surface, x0, y0
+
+
+@functools.lru_cache(maxsize=STATS_CACHE_SIZE)
+def stats_sprite(values, font_size, color):
+    """The whole stats panel as one sprite, its rows come from text_sprite."""
+    # Most rows did not change, only the others are shaped again
+    rows = [
+        (text_sprite(text, font_size, color), font_size * row)
+        for row, text in stats_text(values)
+    ]
+    rects = [sprite_rect(sprite, 0, y) for sprite, y in rows]
+    x0 = min(x for x, _, _, _ in rects)
+    y0 = min(y for _, y, _, _ in rects)
+    x1 = max(x + w for x, _, w, _ in rects)
+    y1 = max(y + h for _, y, _, h in rects)
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, x1 - x0, y1 - y0)
+    cr = cairo.Context(surface)
+    for sprite, y in rows:
+        paint_sprite(cr, sprite, -x0, y - y0)
+    surface.flush()
+    return surface, x0, y0
+
+
+def sprite_rect(sprite, x, y):
+    surface, dx, dy = sprite
+    return (round(x) + dx, round(y) + dy, surface.get_width(), surface.get_height())
+
+
+def paint_sprite(cr, sprite, x, y):
+    # Whole pixel offsets keep the composite a plain blit
+    surface, dx, dy = sprite
+    cr.set_source_surface(surface, round(x) + dx, round(y) + dy)
+    cr.paint()
+
+
+def overlay_rects(self):
+    """Bounding boxes of everything on_draw puts over the image."""
+    rects = []
+    pad = self.line_thickness / 2
+    lines, total_len_y, total_len_x = measure_lines(
+        self.cursor_pos, self.line_endpoints, self.line_angles
+    )
+    cursor = to_screen(self, *self.cursor_pos)
+    for end, (line_name, length) in zip(self.line_endpoints, lines):
+        x, y = to_screen(self, *end)
+        x0, x1 = sorted((cursor[0], x))
+        y0, y1 = sorted((cursor[1], y))
+        rects.append((x0 - pad, y0 - pad, x1 - x0 + 2 * pad, y1 - y0 + 2 * pad))
+        if show_label(self, length):
+            sprite = text_sprite(
+                f"{line_name} ({length:.0f}px)",
+                self.font_size,
+                tuple(self.line_text_color),
+            )
+            rects.append(sprite_rect(sprite, *line_label_pos(self, end)))
+    element = element_layout(self)
+    if element is not None:
+        (x0, y0, x1, y1), label, (x, y) = element
+        # The four sides, not the inside of the box
+        rects += [
+            (x0 - pad, y0 - pad, x1 - x0 + 2 * pad, 2 * pad),
+            (x0 - pad, y1 - pad, x1 - x0 + 2 * pad, 2 * pad),
+            (x0 - pad, y0 - pad, 2 * pad, y1 - y0 + 2 * pad),
+            (x1 - pad, y0 - pad, 2 * pad, y1 - y0 + 2 * pad),
+            sprite_rect(
+                text_sprite(label, self.font_size, tuple(self.line_text_color)), x, y
+            ),
+        ]
+    sprite = stats_sprite(
+        stats_values(self, lines, total_len_y, total_len_x),
+        self.stats_font_size,
+        tuple(self.stats_text_color),
+    )
+    rects.append(sprite_rect(sprite, *self.stats_pos))
+    return [
+        cairo.RectangleInt(
+            int(math.floor(x)) - DAMAGE_PADDING,
+            int(math.floor(y)) - DAMAGE_PADDING,
+            int(math.ceil(w)) + 2 * DAMAGE_PADDING + 1,
+            int(math.ceil(h)) + 2 * DAMAGE_PADDING + 1,
+        )
+        for x, y, w, h in rects
+    ]
+
+
+def queue_overlay_draw(self):
+    """Invalidate the old and the new overlay instead of the whole window."""
+    rects = overlay_rects(self)
+    region = cairo.Region(self.overlay_rects + rects)
+    self.overlay_rects = rects
+    self.queue_draw_region(region)
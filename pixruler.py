@@ -14,13 +14,25 @@
 # You should have received a copy of the GNU General Public License
 # along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
 
+import time
+
+# Taken before anything else is imported, for --startup-profile
+STARTUP_TIME = time.perf_counter()
+
 from actions import *
 from utils import *
+from image_cache import ImageCache
+from overlay import *
+from view import *
+from live import start_live, clear_window
+from video import show_item
+from snap import snap_position
+from profiler import timed
+from recorder import Recorder
+import profiler
+import capture
 import cairo
 import sys
-import numpy as np
-import cv2
-import pyscreenshot
 import gi
 
 gi.require_version("Gtk", "3.0")
@@ -30,7 +42,7 @@ from gi.repository import Gtk, GdkPixbuf, Gdk
 
 class ScreenCaptureWindow(Gtk.Window):
 
-    def __init__(self):
+    def __init__(self, startup_profile=None, live=False, record=None):
         Gtk.Window.__init__(self, title="PixRuler")
         self.connect(
             "realize",
@@ -41,43 +53,29 @@ class ScreenCaptureWindow(Gtk.Window):
             ),
         )
 
-        # Default values
-        self.step_size = 1
-        self.step_size_mp = 1
-        self.font_size = 12
-        self.stats_font_size = 12
-        self.line_thickness = 1
-        self.offset = [0, 0]
-        self.TEXT_DISPLAY_THRESHOLD = 80
-        self.colors = [
-            (1, 0, 0),  # Red
-            (0, 1, 0),  # Green
-            (0, 1, 1),  # Cyan
-            (1, 0, 1),  # Magenta
-            (1, 1, 0),  # Yellow
-        ]
-        self.line_text_color = self.colors[1]
-        self.stats_text_color = self.colors[1]
-        self.line_color = self.colors[0]
-        self.is_live_colors = False
-        self.cursor_pos = [0, 0]
-        self.text_pos = [0, 0]
-        self.line_endpoints = []
-        self.stats_pos = [100, 100]
-        self.lower_threshold = 50
-        self.upper_threshold = 70
+        set_defaults(self)
+        # List of (stage, perf_counter) marks, printed after the first on_draw
+        self.startup_profile = startup_profile
+        # The window is fullscreen on the monitor under the pointer, and a
+        # screen capture is of that monitor only
+        self.monitor = pointer_monitor()
+        self.view_size = screen_size(self.monitor)
 
         # Capture the screen
         if len(sys.argv) > 1:
             self.arg_count = len(sys.argv)
-            self.current_arg_index = 1
-            prepare_image(self, sys.argv[self.current_arg_index])
+            self.image_cache = ImageCache(sys.argv, *self.view_size)
+            show_item(self, 1)
+            startup_mark(self, "load image + edge detection")
         else:
-            self.img = pyscreenshot.grab()
-            # Convert to OpenCV format
-            self.img = np.array(self.img)
-
-        update_edges_and_pixbuf(self)
+            self.img = grab_screen(self.monitor, monitor_bbox(self.monitor))
+            self.capture_time = capture.last_capture_time
+            startup_mark(self, "capture")
+            if not (live and start_live(self)):
+                update_edges_and_pixbuf(self)
+            # Pixel for pixel over the screen it was taken from
+            set_view(self, "1:1")
+            startup_mark(self, "edge detection")
 
         height, width, channels = self.img.shape
         # Center the starting cursor position
@@ -96,86 +94,105 @@ class ScreenCaptureWindow(Gtk.Window):
         self.connect("key-press-event", self.on_key_press)
         self.add_events(Gdk.EventMask.KEY_PRESS_MASK)
         # Set window properties
-        self.fullscreen()
+        self.fullscreen_on_monitor(self.get_screen(), self.monitor)
         self.set_keep_above(True)
         self.connect("destroy", Gtk.main_quit)
         self.show_all()
         update_lines(self)
+        startup_mark(self, "window setup")
+        if record is not None:
+            self.recorder = Recorder(record, self, sys.argv[1:])
 
+    @timed
     def on_draw(self, widget, cr):
-        # Draw the GdkPixbuf
-        Gdk.cairo_set_source_pixbuf(cr, self.pixbuf, 0, 0)
-        cr.paint()
+        # Draw the captured image, in live mode the screen itself shows through
+        # the window, offscreen renders (widget None) still get the frame
+        if self.live is not None and widget is not None:
+            clear_window(cr)
+            if self.overlay_hidden:
+                return
+        else:
+            paint_image(self, cr)
+        edge_overlay = self.edge_overlay
+        # Until it is rebuilt for a new image, the old one would not fit it
+        if edge_overlay is not None and edge_overlay.shape == self.img.shape[:2]:
+            paint_levels(self, cr, edge_overlay)
         cr.set_line_width(self.line_thickness)
-        total_len_y = 0
-        total_len_x = 0
-        line_name = "INITIALIZE"
-        for i, (start, end) in enumerate(
-            zip([self.cursor_pos] * 4, self.line_endpoints)
-        ):
-            cr.set_source_rgb(*self.line_color)
-            cr.move_to(start[0], start[1])
-            cr.line_to(end[0], end[1])
-            cr.stroke()
-            length = cv2.norm(np.array(end) - np.array(start))
-            self.text_pos[0] = (start[0] + end[0]) // 2 + self.offset[0]
-            self.text_pos[1] = (start[1] + end[1]) // 2 + self.offset[1]
-            if start[0] == end[0]:  # Vertical line
-                line_name = "-y" if start[1] < end[1] else "y"
-                total_len_y += length
-            elif start[1] == end[1]:  # Horizontal line
-                line_name = "x" if start[0] < end[0] else "-x"
-                total_len_x += length
-
-            cr.set_source_rgb(*self.line_text_color)
-            cr.set_font_size(self.font_size)
-
-            if length > self.TEXT_DISPLAY_THRESHOLD + self.font_size:
-                cr.move_to(self.text_pos[0], self.text_pos[1])
-                cr.show_text(f"{line_name} ({length:.0f}px)")
-
-            cr.set_source_rgb(*self.stats_text_color)
-            cr.set_font_size(self.stats_font_size)
-            cr.move_to(
-                self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * i * 2
-            )
-            cr.show_text(f"{line_name} ({length:.0f}px)")
-
-        cr.set_source_rgb(*self.stats_text_color)
-        cr.set_font_size(self.stats_font_size)
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 8)
-        cr.show_text(f"Cursor Position: {self.cursor_pos}")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 10)
-        cr.show_text(f"Total Length Y: {total_len_y:.0f}px")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 12)
-        cr.show_text(f"Total Length X: {total_len_x:.0f}px")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 14)
-        cr.show_text(f"Lower Threshold: {self.lower_threshold}")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 16)
-        cr.show_text(f"Upper Threshold: {self.upper_threshold}")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 18)
-        cr.show_text(f"Step Size: {self.step_size_mp}")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 20)
-        cr.show_text(f"Step Size with Multiplier: {self.step_size}")
-        cr.move_to(self.stats_pos[0], self.stats_pos[1] + self.stats_font_size * 22)
-        cr.show_text(f"Live Color: {self.is_live_colors}")
+        # Lengths are in image pixels, the lines are drawn in window pixels
+        lines, total_len_y, total_len_x = measure_lines(
+            self.cursor_pos, self.line_endpoints, self.line_angles
+        )
+        cr.set_source_rgb(*self.line_color)
+        cursor = to_screen(self, *self.cursor_pos)
+        for end in self.line_endpoints:
+            cr.move_to(*cursor)
+            cr.line_to(*to_screen(self, *end))
+        element = element_layout(self)
+        if element is not None:
+            (x0, y0, x1, y1), label, label_pos = element
+            cr.rectangle(x0, y0, x1 - x0, y1 - y0)
+        cr.stroke()
+
+        # Text comes from the sprite caches, shaped only when it changed
+        for end, (line_name, length) in zip(self.line_endpoints, lines):
+            if show_label(self, length):
+                sprite = text_sprite(
+                    f"{line_name} ({length:.0f}px)",
+                    self.font_size,
+                    tuple(self.line_text_color),
+                )
+                paint_sprite(cr, sprite, *line_label_pos(self, end))
+        if element is not None:
+            sprite = text_sprite(label, self.font_size, tuple(self.line_text_color))
+            paint_sprite(cr, sprite, *label_pos)
+        sprite = stats_sprite(
+            stats_values(self, lines, total_len_y, total_len_x),
+            self.stats_font_size,
+            tuple(self.stats_text_color),
+        )
+        paint_sprite(cr, sprite, *self.stats_pos)
+
+        if widget is not None:
+            profiler.frame_painted()
+
+        if self.startup_profile is not None:
+            startup_mark(self, "first on_draw")
+            print_startup_profile(self.startup_profile)
+            self.startup_profile = None
 
     def on_motion_notify(self, widget, event):
-        self.cursor_pos = [int(event.x), int(event.y)]
-        live_colors(self)
-        update_lines(self)
-        self.queue_draw()
+        self.events_received += 1
+        profiler.event_received()
+        if self.recorder is not None:
+            self.recorder.record("motion", event)
+        if event.state & Gdk.ModifierType.BUTTON2_MASK:
+            # Dragging with the middle button pans the view
+            pan_view(
+                self,
+                event.x - self.pointer_pos[0],
+                event.y - self.pointer_pos[1],
+            )
+        self.pointer_pos = [event.x, event.y]
+        self.cursor_pos = snap_position(self, to_image(self, event.x, event.y))
+        queue_update(self)
 
     def on_button_press(self, widget, event):
-        action = button_actions.get((event.type, event.button))
-        if action:
+        self.events_received += 1
+        profiler.event_received()
+        if self.recorder is not None:
+            self.recorder.record("button", event)
+        entry = button_actions.get((event.type, event.button))
+        if entry:
+            invalidates, action = entry
             action(self, event)
-            self.queue_draw()
+            queue_update(self, invalidates)
             return
 
-        self.queue_draw()
-
     def on_key_press(self, widget, event):
+        self.events_received += 1
+        profiler.event_received()
+        if self.recorder is not None:
+            self.recorder.record("key", event)
         control_pressed = event.state & Gdk.ModifierType.CONTROL_MASK
         alt_pressed = event.state & Gdk.ModifierType.MOD1_MASK
         self.step_size = self.step_size_mp
@@ -186,31 +203,54 @@ class ScreenCaptureWindow(Gtk.Window):
         elif alt_pressed:
             self.step_size *= 2
 
-        action = key_actions.get(event.keyval)
-        # If no action found for single key value, check for key-value pairs
-        if action is None:
-            for key in key_actions.keys():
-                if isinstance(key, tuple) and event.keyval in key:
-                    action = key_actions[key]
-                    break
-
-        if action:
+        entry = key_actions.get(event.keyval)
+        if entry:
+            invalidates, action = entry
             action(self, event)
-            self.queue_draw()
+            queue_update(self, invalidates)
             return
 
     def on_scroll(self, widget, event):
         if event.direction == Gdk.ScrollDirection.SMOOTH:
             return
 
-        action = scroll_actions.get((event.type, event.state))
+        self.events_received += 1
+        profiler.event_received()
+        if self.recorder is not None:
+            self.recorder.record("scroll", event)
+        entry = scroll_actions.get((event.type, event.state))
 
-        if action:
+        if entry:
+            invalidates, action = entry
             action(self, event)
-            self.queue_draw()
+            queue_update(self, invalidates)
             return
 
 
 if __name__ == "__main__":
-    win = ScreenCaptureWindow()
+    startup_profile = None
+    if "--startup-profile" in sys.argv:
+        # Remove the flag so it is not taken for an image
+        sys.argv.remove("--startup-profile")
+        startup_profile = [("start", STARTUP_TIME), ("import", time.perf_counter())]
+    live = "--live" in sys.argv
+    if live:
+        sys.argv.remove("--live")
+    trace_path = None
+    if "--trace" in sys.argv:
+        i = sys.argv.index("--trace")
+        trace_path = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+        profiler.start_trace()
+    record_path = None
+    if "--record" in sys.argv:
+        i = sys.argv.index("--record")
+        record_path = sys.argv[i + 1]
+        del sys.argv[i : i + 2]
+    win = ScreenCaptureWindow(startup_profile, live, record_path)
     Gtk.main()
+    persist_edges(win)
+    if trace_path is not None:
+        profiler.write_trace(trace_path)
+    if win.recorder is not None:
+        win.recorder.close()
@@ -0,0 +1,159 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# profiler.py
+# contains the timing spans around the hot paths. Nothing is recorded until
+# the profiler is shown in the stats panel (i key) or a trace is requested
+# with --trace FILE; then every span keeps its last ROLLING durations for the
+# p50/p95 rows, along with the frame time and the latency from an input
+# event to the frame that shows it, and with --trace the spans are written
+# as a Chrome trace (chrome://tracing, ui.perfetto.dev) on exit.
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# Samples kept per span for the percentiles
+ROLLING = 240
+# Trace events kept, the oldest ones are dropped past that
+MAX_TRACE_EVENTS = 1_000_000
+
+# Seconds between two frames above which the window is taken to be idle
+IDLE_GAP = 0.5
+
+FRAME_TIME = "frame time"
+EVENT_TO_PAINT = "event to paint"
+
+_overlay = False
+_trace = None
+_samples = {}
+_last_frame = None
+_pending_event = None
+
+
+def recording():
+    return _overlay or _trace is not None
+
+
+def record(name, start, end):
+    if name not in _samples:
+        _samples[name] = deque(maxlen=ROLLING)
+    _samples[name].append(end - start)
+    if _trace is not None:
+        _trace.append(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+        )
+
+
+@contextmanager
+def span(name):
+    if not recording():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter())
+
+
+def timed(fn):
+    """Record every call of fn as a span named after it."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not recording():
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(fn.__name__, start, time.perf_counter())
+
+    return wrapper
+
+
+def toggle_overlay():
+    global _overlay
+    _overlay = not _overlay
+    return _overlay
+
+
+def start_trace():
+    global _trace
+    _trace = deque(maxlen=MAX_TRACE_EVENTS)
+
+
+def write_trace(path):
+    with open(path, "w") as f:
+        json.dump({"traceEvents": list(_trace), "displayTimeUnit": "ms"}, f)
+
+
+def event_received():
+    # Latency is measured from the oldest event a frame is the answer to
+    global _pending_event
+    if _pending_event is None and recording():
+        _pending_event = time.perf_counter()
+
+
+def frame_painted():
+    global _last_frame, _pending_event
+    if not recording():
+        return
+    now = time.perf_counter()
+    # Gaps while nothing changed are not frame times, slow frames still show
+    # up in the event to paint latency
+    if _last_frame is not None and now - _last_frame < IDLE_GAP:
+        record(FRAME_TIME, _last_frame, now)
+    _last_frame = now
+    if _pending_event is not None:
+        record(EVENT_TO_PAINT, _pending_event, now)
+        _pending_event = None
+
+
+def stats_lines(events=None, frames=None):
+    """Stats panel lines with the p50/p95 of every span, when shown.
+
+    events and frames are the input events handled and the frames computed
+    for them, shown along when given.
+    """
+    if not _overlay:
+        return []
+    lines = []
+    if events is not None:
+        lines.append(f"events: {events} in {frames} frames")
+    names = [FRAME_TIME, EVENT_TO_PAINT]
+    # The derived maps record their spans from a worker thread
+    names += sorted(name for name in list(_samples) if name not in names)
+    for name in names:
+        samples = _samples.get(name)
+        if not samples:
+            continue
+        p50, p95 = np.percentile(samples, [50, 95]) * 1000
+        lines.append(f"{name}: p50 {p50:.2f}ms p95 {p95:.2f}ms")
+    return lines
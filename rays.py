@@ -0,0 +1,100 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# rays.py
+# contains the ray mode (a key), which measures along 8 or 16 rays around the
+# cursor, or along a single line through it, instead of the four axis-aligned
+# rays, and rotates them by any angle (w/W keys). The pixels of all the rays
+# are walked as one DDA grid: ray i steps one pixel along its major axis per
+# column, so the whole (rays, steps) block of positions is built and looked
+# up in the edge map with a few array operations, however many rays there are.
+
+import numpy as np
+
+# Rays cast in turn by the a key, 4 at no rotation is the axis-aligned mode
+RAY_COUNTS = (4, 8, 16, 2)
+
+
+def ray_angles(count, rotation=0):
+    """Angles in degrees, counterclockwise from the x axis, of count rays."""
+    return [(rotation + 360 * i / count) % 360 for i in range(count)]
+
+
+def axis_aligned(self):
+    return self.ray_count == 4 and self.ray_rotation % 90 == 0
+
+
+def ray_grid(cursor_pos, angles, width, height):
+    """Pixel positions along every ray, up to the image border.
+
+    Returns xs and ys of shape (rays, steps), step 0 being the cursor, and
+    the number of steps of every ray before it leaves the image.
+    """
+    x, y = cursor_pos
+    radians = np.radians(np.asarray(angles, dtype=np.float64))
+    # Screen y grows downwards, so a ray at 90 degrees goes up
+    dx, dy = np.cos(radians), -np.sin(radians)
+    # Whole pixels along the major axis, the other one follows in fractions
+    major = np.maximum(np.abs(dx), np.abs(dy))
+    dx, dy = dx / major, dy / major
+    dx[np.abs(dx) < 1e-9] = 0
+    dy[np.abs(dy) < 1e-9] = 0
+    # Steps until the position is half a pixel past the border, a bound on
+    # where its rounding leaves the image
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reach_x = np.where(
+            dx > 0, (width - 0.5 - x) / dx, np.where(dx < 0, (x + 0.5) / -dx, np.inf)
+        )
+        reach_y = np.where(
+            dy > 0,
+            (height - 0.5 - y) / dy,
+            np.where(dy < 0, (y + 0.5) / -dy, np.inf),
+        )
+    bound = np.floor(np.minimum(reach_x, reach_y)).astype(np.int64) + 2
+    t = np.arange(bound.max())
+    xs = np.rint(x + np.outer(dx, t)).astype(np.int64)
+    ys = np.rint(y + np.outer(dy, t)).astype(np.int64)
+    # A straight line leaves the image once, the pixels inside are a prefix
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    steps = inside.sum(axis=1)
+    # Steps past the border of the shorter rays stay on their last pixel
+    np.clip(xs, 0, width - 1, out=xs)
+    np.clip(ys, 0, height - 1, out=ys)
+    return xs, ys, steps
+
+
+def first_edges(edges, xs, ys, steps, columns=slice(None)):
+    """Step of the first edge pixel of every ray in columns, -1 for none."""
+    inside = np.arange(xs.shape[1])[columns] < steps[:, None]
+    hits = (edges[ys[:, columns], xs[:, columns]] > 0) & inside
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+
+def endpoints(xs, ys, steps, hits):
+    # Rays without an edge end at the image border
+    ends = np.where(hits >= 0, hits, steps - 1)
+    rays = np.arange(len(ends))
+    return list(zip(xs[rays, ends].tolist(), ys[rays, ends].tolist()))
+
+
+def cast_rays(edges, cursor_pos, angles):
+    """End of every ray from cursor_pos at the first edge or the border."""
+    x, y = cursor_pos
+    if edges[y, x] > 0:
+        return [(x, y)] * len(angles)
+    height, width = edges.shape
+    xs, ys, steps = ray_grid(cursor_pos, angles, width, height)
+    return endpoints(xs, ys, steps, first_edges(edges, xs, ys, steps))
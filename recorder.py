@@ -0,0 +1,96 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# recorder.py
+# contains the input recorder (--record FILE). The first line of the JSON
+# lines log holds the images measured and the starting state, every line
+# after that one motion, button, key or scroll event as the handlers saw it,
+# with the seconds since the start. A screen capture is saved next to the
+# log as FILE.png, so replay.py can feed the same session back through the
+# action tables without a window.
+
+import json
+import os
+import time
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Window attributes the session starts from, restored before a replay
+RECORDED_STATE = (
+    "cursor_pos",
+    "stats_pos",
+    "view_mode",
+    "view_origin",
+    "view_scale",
+    "view_size",
+    "lower_threshold",
+    "upper_threshold",
+    "step_size_mp",
+    "font_size",
+    "stats_font_size",
+    "line_thickness",
+    "offset",
+    "colors",
+    "line_color",
+    "line_text_color",
+    "stats_text_color",
+    "is_live_colors",
+    "ray_count",
+    "ray_rotation",
+    "snap_mode",
+    "show_elements",
+    "show_edges",
+    "capture_time",
+)
+
+# The event fields each handler reads
+EVENT_FIELDS = {
+    "motion": ("x", "y", "state"),
+    "button": ("type", "button", "x", "y", "state"),
+    "key": ("keyval", "state"),
+    "scroll": ("type", "direction", "x", "y", "state"),
+}
+
+
+class Recorder:
+
+    def __init__(self, path, window, images):
+        self.file = open(path, "w", buffering=1)
+        if not images:
+            # The screen is gone by the time of the replay, keep the capture
+            images = [os.path.abspath(path) + ".png"]
+            cv2.imwrite(images[0], window.img)
+        header = {
+            "images": [os.path.abspath(image) for image in images],
+            "index": getattr(window, "current_arg_index", 1) - 1,
+            "frame": window.frame_index,
+            "live": window.live is not None,
+            "state": {name: getattr(window, name) for name in RECORDED_STATE},
+        }
+        self.file.write(json.dumps(header) + "\n")
+        self.start = time.perf_counter()
+
+    def record(self, kind, event):
+        line = {"t": time.perf_counter() - self.start, "kind": kind}
+        for field in EVENT_FIELDS[kind]:
+            value = getattr(event, field)
+            # Gdk enums and flags are ints
+            line[field] = value if isinstance(value, float) else int(value)
+        self.file.write(json.dumps(line) + "\n")
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,258 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# replay.py
+# contains the replay runner for the logs written by pixruler --record FILE.
+# The session is fed back through the same handlers and action tables
+# without a window or a display: the events are grouped into the frames
+# they arrived in, every frame is computed and drawn onto an offscreen
+# surface, and the latency from each event to the end of the frame that
+# answers it is reported. A lag report turns into a repeatable performance
+# test, with the same --output/--compare as bench.py.
+#
+# usage: python replay.py session.jsonl [--fps 60] [--output new.json]
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+import numpy as np
+import cairo
+import utils
+from utils import *
+from image_cache import ImageCache
+from screenshot import ScreenshotSaver
+from video import show_item, show_frame
+from recorder import RECORDED_STATE
+from pixruler import ScreenCaptureWindow
+from bench import metadata, compare
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gdk, GLib
+
+HANDLERS = {
+    "motion": "on_motion_notify",
+    "button": "on_button_press",
+    "key": "on_key_press",
+    "scroll": "on_scroll",
+}
+# Slowest events listed after the summary
+SLOWEST = 10
+
+
+class ReplayWindow:
+    """Stands in for ScreenCaptureWindow, without a display."""
+
+    on_draw = ScreenCaptureWindow.on_draw
+    on_motion_notify = ScreenCaptureWindow.on_motion_notify
+    on_button_press = ScreenCaptureWindow.on_button_press
+    on_key_press = ScreenCaptureWindow.on_key_press
+    on_scroll = ScreenCaptureWindow.on_scroll
+
+    def __init__(self, header):
+        set_defaults(self)
+        self.startup_profile = None
+        self.ticks = []
+        state = header["state"]
+        self.view_size = tuple(state["view_size"])
+        # Laid out like sys.argv, the images start at index 1
+        paths = [sys.argv[0]] + header["images"]
+        self.arg_count = len(paths)
+        # Edge maps are computed as they were in the session, not loaded from
+        # the disk cache, so every replay times the same work
+        self.image_cache = ImageCache(paths, *self.view_size, persist=False)
+        show_item(self, header["index"] + 1)
+        if self.video is not None and header["frame"]:
+            show_frame(self, header["frame"])
+        for name in RECORDED_STATE:
+            # Logs of older versions keep the defaults of what they lack
+            if name in state:
+                setattr(self, name, state[name])
+        self.view_size = tuple(self.view_size)
+        update_edges(self)
+        self.target = cairo.ImageSurface(cairo.FORMAT_RGB24, *self.view_size)
+        self.context = cairo.Context(self.target)
+        queue_update(self)
+        self.settle()
+
+    def add_tick_callback(self, callback):
+        self.ticks.append(callback)
+        return len(self.ticks)
+
+    def queue_draw(self):
+        pass
+
+    def queue_draw_region(self, region):
+        pass
+
+    def frame(self):
+        # What the frame clock and the draw signal would run
+        ticks, self.ticks = self.ticks, []
+        for callback in ticks:
+            callback(self, None)
+        self.on_draw(None, self.context)
+        self.target.flush()
+
+    def settle(self):
+        # Snap maps and element indexes are built off the main thread and
+        # arrive through the main loop, wait for them outside of the timings
+        # so every run sees them at the same point of the session
+        context = GLib.MainContext.default()
+        while self.derived_pending:
+            context.iteration(True)
+        while context.pending():
+            context.iteration(False)
+        if self.ticks:
+            self.frame()
+
+
+def read_log(path):
+    with open(path) as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+def frames(events, fps):
+    """Group the events into the frames they arrived in, one each for fps 0."""
+    group = []
+    slot = None
+    for i, event in enumerate(events):
+        current = int(event["t"] * fps) if fps else i
+        if group and current != slot:
+            yield group
+            group = []
+        slot = current
+        group.append(event)
+    if group:
+        yield group
+
+
+def replay(window, events, fps):
+    """Latency in milliseconds of every event, in order."""
+    latencies = []
+    for group in frames(events, fps):
+        starts = []
+        for event in group:
+            if event["kind"] == "key" and event["keyval"] == Gdk.KEY_q:
+                # Quitting would need the main loop
+                return latencies
+            fields = {k: v for k, v in event.items() if k not in ("t", "kind")}
+            starts.append(time.perf_counter())
+            getattr(window, HANDLERS[event["kind"]])(None, SimpleNamespace(**fields))
+        window.frame()
+        end = time.perf_counter()
+        latencies += [(end - start) * 1000 for start in starts]
+        window.settle()
+    return latencies
+
+
+def summarize(events, latencies):
+    """Latency percentiles of all the events and of every kind of event."""
+    kinds = {"all": latencies}
+    for event, latency in zip(events, latencies):
+        kinds.setdefault(event["kind"], []).append(latency)
+    return {
+        kind: {
+            "median_ms": float(np.median(values)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "max_ms": float(np.max(values)),
+            "events": len(values),
+        }
+        for kind, values in kinds.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a pixruler --record log and report the latencies."
+    )
+    parser.add_argument("log", help="log written by pixruler --record")
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=60,
+        help="frame rate the events are grouped at, 0 for a frame per event",
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of a previous replay")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="allowed median slowdown before --compare fails (0.1 = 10%%)",
+    )
+    args = parser.parse_args()
+
+    header, events = read_log(args.log)
+    if header["live"]:
+        print("replay: live sessions are replayed over their first capture")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Screenshots taken during the session are not wanted twice
+        utils.screenshot_saver = ScreenshotSaver(tmp)
+        window = ReplayWindow(header)
+        latencies = replay(window, events, args.fps)
+        utils.screenshot_saver.executor.shutdown()
+    if not latencies:
+        print("replay: no events to replay")
+        return
+
+    results = summarize(events, latencies)
+    for kind, result in results.items():
+        print(
+            f"{kind:8} {result['events']:6} events  "
+            f"median {result['median_ms']:8.3f} ms  "
+            f"p95 {result['p95_ms']:8.3f} ms  "
+            f"p99 {result['p99_ms']:8.3f} ms  "
+            f"max {result['max_ms']:8.3f} ms"
+        )
+    print(
+        f"{window.events_received} events handled in "
+        f"{window.frames_computed} computed frames"
+    )
+    print()
+    order = np.argsort(latencies)[::-1][:SLOWEST]
+    for i in order:
+        event = events[i]
+        print(f"#{i:<6} t {event['t']:8.3f}s  {event['kind']:6} {latencies[i]:8.3f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "meta": metadata(),
+                    "results": results,
+                    "latencies": latencies,
+                    "events_received": window.events_received,
+                    "frames_computed": window.frames_computed,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print()
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# screenshot.py
+# contains the screenshot saver used by the RETURN key. Frames are PNG encoded
+# on a background worker so the window never waits on the encoder, and the
+# screenshot.png, screenshot_01.png, ... names are allocated from a counter
+# after scanning the directory once instead of probing one name at a time.
+
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+NAME_PATTERN = re.compile(r"screenshot(?:_(\d+))?\.png")
+
+
+def screenshot_name(count):
+    if count == 0:
+        return "screenshot.png"
+    return f"screenshot_{count:02}.png"  # Padded count
+
+
+class ScreenshotSaver:
+
+    def __init__(self, directory="."):
+        self.directory = directory
+        self.taken = None
+        self.count = 0
+        # A single worker keeps the saves in order
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="pixruler-save"
+        )
+
+    def next_path(self):
+        if self.taken is None:
+            self.taken = set()
+            for entry in os.scandir(self.directory):
+                match = NAME_PATTERN.fullmatch(entry.name)
+                if match is None:
+                    continue
+                count = int(match.group(1) or 0)
+                # Only names this saver would produce block a count
+                if entry.name == screenshot_name(count):
+                    self.taken.add(count)
+        while True:
+            path = os.path.join(self.directory, screenshot_name(self.count))
+            self.count += 1
+            # The exists check only guards against files created since the scan
+            if self.count - 1 not in self.taken and not os.path.exists(path):
+                return path
+
+    def save(self, bgra):
+        """Queue a BGRA frame for encoding and return the path it will have."""
+        path = self.next_path()
+        future = self.executor.submit(_write, path, bgra)
+        future.add_done_callback(_report_error)
+        return path
+
+
+def _write(path, bgra):
+    if not cv2.imwrite(path, cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR)):
+        raise OSError(f"could not write {path}")
+
+
+def _report_error(future):
+    if future.exception() is not None:
+        print(
+            f"pixruler: saving screenshot failed: {future.exception()}", file=sys.stderr
+        )
@@ -0,0 +1,110 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# snap.py
+# contains the snapping mode (e key), which moves the cursor under the
+# pointer to the nearest edge pixel, or to the nearest corner of the edges.
+# The nearest one for every pixel is precomputed once per edge map with a
+# distance transform that labels every pixel with its nearest target, so a
+# motion event only looks up two arrays. The maps are rebuilt on a worker
+# thread (derived.py) whenever the edges change; until the new one is ready
+# the cursor follows the pointer without snapping.
+
+import numpy as np
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Snapping modes in the order the e key cycles through them
+SNAP_MODES = (None, "edge", "corner")
+# Window pixels from the pointer beyond which targets are not snapped to
+SNAP_RADIUS = 24
+# Pixels around a detected corner searched for the vertex on the edges
+CORNER_REACH = 4
+
+
+def edge_corners(edges):
+    # Strong corners of the edge map itself, at least 3 pixels apart
+    corners = cv2.goodFeaturesToTrack(edges, 0, 0.05, 3)
+    targets = np.zeros_like(edges)
+    if corners is None:
+        return targets
+    xs, ys = corner_vertices(edges, np.rint(corners.reshape(-1, 2)).astype(np.int64))
+    targets[ys, xs] = 255
+    return targets
+
+
+def corner_vertices(edges, corners):
+    """Edge pixels at the vertex of every corner, as xs and ys.
+
+    Corner detectors answer a couple of pixels inside the angle, off the
+    edges. Seen from there the edge pixels around are the two arms, and
+    their mean lies towards the vertex: the vertex is the edge pixel
+    farthest that way, the one closest to the corner among ties (a cut
+    corner is a short diagonal across that direction).
+    """
+    height, width = edges.shape
+    offsets = np.arange(-CORNER_REACH, CORNER_REACH + 1)
+    oy, ox = [o.ravel() for o in np.meshgrid(offsets, offsets, indexing="ij")]
+    xs = corners[:, :1] + ox
+    ys = corners[:, 1:] + oy
+    on_edge = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    on_edge[on_edge] = edges[ys[on_edge], xs[on_edge]] > 0
+    count = on_edge.sum(axis=1)
+    found = count > 0
+    xs, ys, on_edge, count = xs[found], ys[found], on_edge[found], count[found]
+    mean_x = (on_edge * ox).sum(axis=1) / count
+    mean_y = (on_edge * oy).sum(axis=1) / count
+    toward = ox * mean_x[:, None] + oy * mean_y[:, None]
+    # Offsets are whole pixels, the distance only breaks ties
+    score = np.where(on_edge, toward - 1e-3 * np.hypot(ox, oy), -np.inf)
+    best = score.argmax(axis=1)
+    rows = np.arange(len(best))
+    return xs[rows, best], ys[rows, best]
+
+
+class SnapMap:
+    """Nearest target pixel and its distance for every pixel of a map."""
+
+    def __init__(self, edges, mode):
+        self.mode = mode
+        self.shape = edges.shape
+        targets = edges if mode == "edge" else edge_corners(edges)
+        self.positions = np.flatnonzero(targets)
+        if not self.positions.size:
+            self.labels = None
+            return
+        # Labels are numbered from 1 in the row-major order of the targets
+        self.distance, self.labels = cv2.distanceTransformWithLabels(
+            np.where(targets > 0, 0, 255).astype(np.uint8),
+            cv2.DIST_L2,
+            5,
+            labelType=cv2.DIST_LABEL_PIXEL,
+        )
+
+    def nearest(self, x, y, radius):
+        """Nearest target to (x, y) as [x, y], None if none is within radius."""
+        if self.labels is None or self.distance[y, x] > radius:
+            return None
+        y, x = divmod(int(self.positions[self.labels[y, x] - 1]), self.shape[1])
+        return [x, y]
+
+
+def snap_position(self, pos):
+    """pos moved to the nearest snap target, if snapping and one is close."""
+    if self.snap_map is None:
+        return pos
+    return self.snap_map.nearest(*pos, SNAP_RADIUS / self.view_scale) or pos
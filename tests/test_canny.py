@@ -0,0 +1,68 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# The threshold engine against cv2.Canny, past the first map of an image
+# (a plain cv2.Canny) where the edges come from its own suppression and
+# hysteresis
+
+import os
+import sys
+import numpy as np
+import cv2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from canny import CannyEngine
+
+THRESHOLDS = [(30, 90), (60, 200), (0, 0), (100, 100), (200, 60), (90, 30)]
+
+
+def noise_gray(seed, block, height=96, width=128):
+    # Upscaled noise has gradients of every direction and strength
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (height // block, width // block), dtype=np.uint8)
+    return cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+@pytest.mark.parametrize("block", [1, 2, 4, 8])
+@pytest.mark.parametrize("seed", range(10))
+def test_matches_canny(block, seed):
+    gray = noise_gray(seed, block)
+    engine = CannyEngine(gray)
+    # The first map is cv2.Canny itself
+    engine.edges(50, 150)
+    for lower, upper in THRESHOLDS:
+        np.testing.assert_array_equal(
+            engine.edges(lower, upper),
+            cv2.Canny(gray, lower, upper),
+            err_msg=f"thresholds {lower}, {upper}",
+        )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_thresholds(seed):
+    rng = np.random.default_rng(seed)
+    # Odd sizes, for the borders of the suppression
+    gray = noise_gray(seed, 2, 61, 97)
+    engine = CannyEngine(gray)
+    engine.edges(50, 150)
+    # Swapped ones included, cv2.Canny takes the smaller one as the lower
+    for lower, upper in rng.integers(0, 400, (20, 2)):
+        np.testing.assert_array_equal(
+            engine.edges(int(lower), int(upper)),
+            cv2.Canny(gray, int(lower), int(upper)),
+            err_msg=f"thresholds {lower}, {upper}",
+        )
@@ -0,0 +1,86 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# Edge index lookups against the per-pixel walk update_lines used to do,
+# for every cursor position of random edge maps
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from edge_index import EdgeIndex, LiveEdgeIndex
+
+
+def walk(start, end, edges):
+    # The old detect_edge_along_line, skipped pixels and all
+    distance = np.hypot(end[0] - start[0], end[1] - start[1])
+    for point in np.linspace(start, end, int(distance)):
+        x, y = point.astype(int)
+        if edges[y, x] > 0:
+            return (x, y)
+    return end
+
+
+def walk_endpoints(edges, x, y):
+    height, width = edges.shape
+    ends = [(x, 0), (x, height - 1), (0, y), (width - 1, y)]
+    return [tuple(int(v) for v in walk((x, y), end, edges)) for end in ends]
+
+
+def random_edges(seed, density, height, width):
+    rng = np.random.default_rng(seed)
+    return np.where(rng.random((height, width)) < density, 255, 0).astype(np.uint8)
+
+
+CASES = [
+    (seed, density, height, width)
+    for seed in range(4)
+    for density in [0, 0.02, 0.1, 0.5, 1]
+    for height, width in [(17, 23), (1, 9), (8, 1), (2, 3), (32, 32)]
+]
+
+
+@pytest.mark.parametrize("seed, density, height, width", CASES)
+def test_line_endpoints(seed, density, height, width):
+    edges = random_edges(seed, density, height, width)
+    index = EdgeIndex(edges)
+    live = LiveEdgeIndex(edges)
+    ys, xs = np.mgrid[:height, :width]
+    up, down, left, right = index.line_endpoints_many(xs.ravel(), ys.ravel())
+    for i, (x, y) in enumerate(zip(xs.ravel(), ys.ravel())):
+        x, y = int(x), int(y)
+        expected = walk_endpoints(edges, x, y)
+        assert index.line_endpoints((x, y)) == expected, (x, y)
+        assert live.line_endpoints((x, y)) == expected, (x, y)
+        many = [(x, up[i]), (x, down[i]), (left[i], y), (right[i], y)]
+        assert [(int(a), int(b)) for a, b in many] == expected, (x, y)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_cursors(seed):
+    rng = np.random.default_rng(seed)
+    edges = random_edges(seed, 0.01, 240, 320)
+    index = EdgeIndex(edges)
+    # Random positions, the borders and the edge pixels themselves
+    cursors = [tuple(p) for p in rng.integers(0, (320, 240), (200, 2))]
+    cursors += [(0, 0), (319, 239), (0, 120), (319, 120), (160, 0), (160, 239)]
+    ys, xs = np.nonzero(edges)
+    cursors += list(zip(xs[:50], ys[:50]))
+    for x, y in cursors:
+        x, y = int(x), int(y)
+        assert index.line_endpoints((x, y)) == walk_endpoints(edges, x, y), (x, y)
@@ -0,0 +1,47 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# Corner snapping lands on the edges, at the corner of a rectangle
+
+import os
+import sys
+import numpy as np
+import cv2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from snap import SnapMap
+
+
+@pytest.mark.parametrize(
+    "rect", [(50, 60, 300, 200), (13, 7, 90, 150), (120, 40, 380, 90)]
+)
+def test_corner_on_edge(rect):
+    x0, y0, x1, y1 = rect
+    img = np.zeros((240, 400), dtype=np.uint8)
+    cv2.rectangle(img, (x0, y0), (x1, y1), 255, -1)
+    edges = cv2.Canny(img, 50, 100)
+    ys, xs = np.nonzero(edges)
+    snap_map = SnapMap(edges, "corner")
+    # The arms of the outline meet at the corners of its bounding box,
+    # Canny may cut the corner pixel itself off diagonally
+    for cx in (xs.min(), xs.max()):
+        for cy in (ys.min(), ys.max()):
+            inside_x = cx + (6 if cx == xs.min() else -6)
+            inside_y = cy + (6 if cy == ys.min() else -6)
+            x, y = snap_map.nearest(inside_x, inside_y, 24)
+            assert edges[y, x] > 0
+            assert max(abs(x - cx), abs(y - cy)) <= 1
@@ -0,0 +1,57 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# Tiled edge detection against cv2.Canny on the whole equalized image
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import cv2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import tiles
+
+
+def noise_image(seed, block, height=96, width=128):
+    # Upscaled noise gives long weak chains that cross many tile borders
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(0, 256, (height // block, width // block), dtype=np.uint8)
+    gray = cv2.resize(noise, (width, height), interpolation=cv2.INTER_LINEAR)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGRA)
+
+
+@pytest.fixture(autouse=True)
+def one_worker(monkeypatch):
+    # The order tiles are resolved in is then the same on every run
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(tiles, "_executor", executor)
+    yield
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("tile_size", [8, 16, 64, 128])
+@pytest.mark.parametrize("block", [2, 4, 8])
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("thresholds", [(30, 90), (60, 200)])
+def test_matches_canny(tile_size, block, seed, thresholds):
+    img = noise_image(seed, block)
+    gray = cv2.equalizeHist(cv2.cvtColor(img, cv2.COLOR_BGRA2GRAY))
+    expected = cv2.Canny(gray, *thresholds)
+    engine = tiles.TiledCanny(img, tile_size=tile_size)
+    edges = engine.index(*thresholds, (img.shape[1] // 3, img.shape[0] // 3))
+    np.testing.assert_array_equal(edges.complete(), expected)
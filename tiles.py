@@ -0,0 +1,395 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# tiles.py
+# contains the tiled edge detection used for very large images. Instead of
+# running equalizeHist and Canny over the whole image before the first frame,
+# the image is cut into tiles that are processed lazily: the tiles the cursor
+# rays run through are computed on demand and a thread pool fills in the rest.
+#
+# The result matches cv2.Canny on the equalized image exactly:
+# - equalization uses the LUT of the global histogram,
+# - every tile is run through cv2.Canny with a 2 pixel halo, enough for the
+#   Sobel gradients and the non-maximum suppression of its border pixels,
+# - hysteresis labels the weak pixels of every tile and joins labels across
+#   tile borders with a union-find, following only the components that have
+#   not reached a strong pixel yet.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from edge_index import EdgeIndex
+from rays import ray_grid, first_edges, endpoints
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Images with more pixels than this are processed in tiles
+TILED_PIXELS = 40_000_000
+TILE_SIZE = 1024
+# Sobel needs 1 pixel around a pixel, the suppression 1 more
+HALO = 2
+
+_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1, thread_name_prefix="pixruler-tiles"
+)
+
+# Neighbour offsets (dy, dx) in 8-connectivity
+NEIGHBOURS = [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+
+
+def equalize_lut(hist):
+    """The lookup table cv2.equalizeHist builds from a 256 bin histogram."""
+    lut = np.zeros(256, dtype=np.uint8)
+    total = int(hist.sum())
+    first = int(np.flatnonzero(hist)[0])
+    if hist[first] == total:
+        lut[:] = first
+        return lut
+    scale = np.float32(255) / np.float32(total - hist[first])
+    sums = np.cumsum(hist[first + 1 :]).astype(np.float32)
+    lut[first + 1 :] = np.clip(np.rint(sums * scale), 0, 255)
+    return lut
+
+
+class TiledCanny:
+
+    def __init__(self, img, tile_size=TILE_SIZE):
+        self.img = img
+        self.height, self.width = img.shape[:2]
+        self.tile_size = tile_size
+        self.rows = -(-self.height // tile_size)
+        self.cols = -(-self.width // tile_size)
+        self.lut_lock = threading.Lock()
+        self.lut = None
+        # The histogram has to cover the whole image. It is one cheap pass,
+        # counted per tile and queued ahead of any tile that needs the LUT.
+        self.histograms = [
+            _executor.submit(self.tile_histogram, tile) for tile in self.tiles()
+        ]
+        self.current = None
+
+    def tiles(self):
+        return [(ty, tx) for ty in range(self.rows) for tx in range(self.cols)]
+
+    def bounds(self, tile):
+        ty, tx = tile
+        y0 = ty * self.tile_size
+        x0 = tx * self.tile_size
+        return (
+            y0,
+            min(y0 + self.tile_size, self.height),
+            x0,
+            min(x0 + self.tile_size, self.width),
+        )
+
+    def equalize(self, gray):
+        with self.lut_lock:
+            if self.lut is None:
+                hist = sum(future.result() for future in self.histograms)
+                self.lut = equalize_lut(hist)
+        return cv2.LUT(gray, self.lut)
+
+    def tile_histogram(self, tile):
+        y0, y1, x0, x1 = self.bounds(tile)
+        gray = cv2.cvtColor(self.img[y0:y1, x0:x1], cv2.COLOR_BGRA2GRAY)
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+        return hist.ravel().astype(np.int64)
+
+    def index(self, lower, upper, cursor_pos=None):
+        """Return the TiledEdgeIndex for the thresholds, filled in lazily."""
+        if self.current is not None:
+            if self.current.thresholds == (lower, upper):
+                return self.current
+            self.current.cancel()
+        self.current = TiledEdgeIndex(self, lower, upper, cursor_pos)
+        return self.current
+
+    def edges(self, lower, upper):
+        return self.index(lower, upper).complete()
+
+    @property
+    def nbytes(self):
+        """Memory held by the edge map being filled in and its tiles."""
+        return 0 if self.current is None else self.current.nbytes
+
+
+class TiledEdgeIndex:
+
+    def __init__(self, engine, lower, upper, cursor_pos=None):
+        self.engine = engine
+        self.thresholds = (lower, upper)
+        if lower > upper:
+            lower, upper = upper, lower
+        self.lower = int(np.floor(lower))
+        self.upper = int(np.floor(upper))
+        self.height = engine.height
+        self.width = engine.width
+        # Filled in tile by tile, only read a tile after resolve() returned
+        self.edges = np.zeros((self.height, self.width), dtype=np.uint8)
+        self.lock = threading.RLock()
+        self.futures = {}
+        self.local = {}
+        # Union-find over the weak components of all computed tiles
+        self.parent = []
+        self.strong = []
+        self.merged = set()
+        self.resolved = set()
+        self.cancelled = False
+        self.full_index = None
+
+        if cursor_pos is None:
+            cursor_pos = (self.width // 2, self.height // 2)
+        tile = self.tile_of(*cursor_pos)
+        order = sorted(
+            engine.tiles(), key=lambda t: max(abs(t[0] - tile[0]), abs(t[1] - tile[1]))
+        )
+        with self.lock:
+            for t in order:
+                self.futures[t] = _executor.submit(self.compute_tile, t)
+        self.fill = _executor.submit(self.resolve_all, order)
+
+    @property
+    def nbytes(self):
+        tiles = sum(
+            labels.nbytes + weak.nbytes
+            for labels, _, _, weak in list(self.local.values())
+        )
+        total = self.edges.nbytes + tiles
+        if self.full_index is not None:
+            # Its edge map is self.edges
+            total += self.full_index.nbytes - self.edges.nbytes
+        return total
+
+    def tile_of(self, x, y):
+        return (y // self.engine.tile_size, x // self.engine.tile_size)
+
+    def cancel(self):
+        self.cancelled = True
+        for future in self.futures.values():
+            future.cancel()
+
+    def compute_tile(self, tile):
+        """Weak component labels of a tile and which of them are strong."""
+        y0, y1, x0, x1 = self.engine.bounds(tile)
+        ry0, rx0 = max(0, y0 - HALO), max(0, x0 - HALO)
+        ry1, rx1 = min(self.height, y1 + HALO), min(self.width, x1 + HALO)
+        gray = cv2.cvtColor(self.engine.img[ry0:ry1, rx0:rx1], cv2.COLOR_BGRA2GRAY)
+        gray = self.engine.equalize(gray)
+        crop = (slice(y0 - ry0, y1 - ry0), slice(x0 - rx0, x1 - rx0))
+        # With equal thresholds every suppression candidate above them is
+        # kept, which gives the weak and the strong pixels of the tile
+        weak = cv2.Canny(gray, self.lower, self.lower)[crop]
+        count, labels = cv2.connectedComponents(weak, connectivity=8, ltype=cv2.CV_32S)
+        strong = np.zeros(count, dtype=bool)
+        strong[labels[cv2.Canny(gray, self.upper, self.upper)[crop] > 0]] = True
+        return weak, labels, strong
+
+    def load(self, tile):
+        # Called with the lock held. Queued tiles are taken over and computed
+        # here rather than waited on, running ones are waited on.
+        if tile in self.local:
+            return self.local[tile]
+        future = self.futures.get(tile)
+        if future is not None and not future.cancel():
+            weak, labels, strong = future.result()
+        else:
+            weak, labels, strong = self.compute_tile(tile)
+        # Global ids of the labels 1..count-1 start at base
+        base = len(self.parent)
+        self.parent.extend(range(base, base + len(strong) - 1))
+        self.strong.extend(strong[1:].tolist())
+        self.local[tile] = (labels, base, len(strong) - 1, weak)
+        return self.local[tile]
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[a] = b
+            self.strong[b] = self.strong[b] or self.strong[a]
+
+    def border(self, tile, direction):
+        """Labels of the tile along the side (or corner) facing direction."""
+        labels = self.local[tile][0]
+        dy, dx = direction
+        rows = slice(None) if dy == 0 else (-1 if dy > 0 else 0)
+        cols = slice(None) if dx == 0 else (-1 if dx > 0 else 0)
+        return np.atleast_1d(labels[rows, cols])
+
+    def merge(self, a, b, direction):
+        """Join the components of a and b touching across their border.
+
+        Returns False when the two tiles had been merged already.
+        """
+        key = (a, b) if a < b else (b, a)
+        if key in self.merged:
+            return False
+        self.merged.add(key)
+        labels_a = self.border(a, direction)
+        labels_b = self.border(b, (-direction[0], -direction[1]))
+        base_a, base_b = self.local[a][1], self.local[b][1]
+        n = len(labels_a)
+        pairs = []
+        # Along a side a pixel touches the three pixels facing it
+        for shift in (-1, 0, 1) if n > 1 else (0,):
+            pa = labels_a[max(0, -shift) : n - max(0, shift)]
+            pb = labels_b[max(0, shift) : n - max(0, -shift)]
+            both = (pa > 0) & (pb > 0)
+            pairs.append(np.stack((pa[both], pb[both]), axis=1))
+        for la, lb in np.unique(np.concatenate(pairs), axis=0):
+            self.union(base_a + int(la) - 1, base_b + int(lb) - 1)
+        return True
+
+    def resolve(self, tile):
+        """Make the edges of tile final, joining components across tiles."""
+        if tile in self.resolved:
+            return
+        with self.lock:
+            if tile in self.resolved:
+                return
+            labels, base, count, weak = self.load(tile)
+            ids = range(base, base + count)
+            # Tiles the open components were followed into. A merge can join
+            # more components of an expanded tile to the open ones, so its
+            # sides are looked at again until no merge changes anything.
+            seen = {tile}
+            changed = True
+            while changed:
+                changed = False
+                # Components of tile that could still reach a strong pixel
+                open_roots = {self.find(i) for i in ids}
+                open_roots = {r for r in open_roots if not self.strong[r]}
+                if not open_roots:
+                    break
+                for current in list(seen):
+                    current_base = self.local[current][1]
+                    for direction in NEIGHBOURS:
+                        ny, nx = current[0] + direction[0], current[1] + direction[1]
+                        if not (
+                            0 <= ny < self.engine.rows and 0 <= nx < self.engine.cols
+                        ):
+                            continue
+                        side = np.unique(self.border(current, direction))
+                        roots = {
+                            self.find(current_base + int(l) - 1) for l in side if l
+                        }
+                        if not roots & open_roots:
+                            continue
+                        self.load((ny, nx))
+                        if self.merge(current, (ny, nx), direction):
+                            changed = True
+                        if (ny, nx) not in seen:
+                            seen.add((ny, nx))
+                            changed = True
+            keep = np.zeros(count + 1, dtype=np.uint8)
+            keep[1:] = [self.strong[self.find(i)] for i in ids]
+            y0, y1, x0, x1 = self.engine.bounds(tile)
+            if keep[1:].all():
+                self.edges[y0:y1, x0:x1] = weak
+            elif keep.any():
+                self.edges[y0:y1, x0:x1] = (keep * 255).take(labels)
+            self.resolved.add(tile)
+
+    def resolve_all(self, order):
+        for tile in order:
+            if self.cancelled:
+                return
+            self.resolve(tile)
+
+    def complete(self):
+        """Resolve every tile and return the full edge map."""
+        for tile in self.engine.tiles():
+            self.resolve(tile)
+        return self.edges
+
+    def line_endpoints(self, cursor_pos):
+        """Same as EdgeIndex.line_endpoints, waiting only on the tiles crossed."""
+        x, y = cursor_pos
+        self.resolve(self.tile_of(x, y))
+        if self.edges[y, x] > 0:
+            return [(x, y)] * 4
+        column = lambda lo, hi: self.edges[lo:hi, x]
+        row = lambda lo, hi: self.edges[y, lo:hi]
+        column_tile = lambda i: (i, x // self.engine.tile_size)
+        row_tile = lambda i: (y // self.engine.tile_size, i)
+        # Same skipped pixel as EdgeIndex, see _search_backward there
+        return [
+            (x, self.scan_backward(column, column_tile, y)),
+            (x, self.scan_forward(column, column_tile, y, self.height)),
+            (self.scan_backward(row, row_tile, x), y),
+            (self.scan_forward(row, row_tile, x, self.width), y),
+        ]
+
+    def scan_backward(self, line, tile_at, pos):
+        size = self.engine.tile_size
+        for i in range(pos // size, -1, -1):
+            lo, hi = i * size, min((i + 1) * size, pos - 1)
+            if hi <= lo:
+                continue
+            self.resolve(tile_at(i))
+            hits = np.flatnonzero(line(lo, hi))
+            if hits.size:
+                return lo + int(hits[-1])
+        return 0
+
+    def scan_forward(self, line, tile_at, pos, length):
+        size = self.engine.tile_size
+        for i in range(pos // size, -(-length // size)):
+            lo, hi = max(i * size, pos + 1), min((i + 1) * size, length - 2)
+            if hi <= lo:
+                continue
+            self.resolve(tile_at(i))
+            hits = np.flatnonzero(line(lo, hi))
+            if hits.size:
+                return lo + int(hits[0])
+        return length - 1
+
+    def ray_endpoints(self, cursor_pos, angles):
+        """Same as cast_rays, waiting only on the tiles up to the edges hit."""
+        x, y = cursor_pos
+        self.resolve(self.tile_of(x, y))
+        if self.edges[y, x] > 0:
+            return [(x, y)] * len(angles)
+        xs, ys, steps = ray_grid(cursor_pos, angles, self.width, self.height)
+        size = self.engine.tile_size
+        hits = np.full(len(angles), -1)
+        # A tile's worth of steps at a time, for the rays without an edge yet
+        for start in range(0, xs.shape[1], size):
+            rays = np.flatnonzero(hits < 0)
+            if not rays.size:
+                break
+            columns = slice(start, start + size)
+            inside = np.arange(xs.shape[1])[columns] < steps[rays, None]
+            tile_ys = ys[rays, columns][inside] // size
+            tile_xs = xs[rays, columns][inside] // size
+            for tile in set(zip(tile_ys.tolist(), tile_xs.tolist())):
+                self.resolve(tile)
+            found = first_edges(self.edges, xs[rays], ys[rays], steps[rays], columns)
+            hits[rays[found >= 0]] = start + found[found >= 0]
+        return endpoints(xs, ys, steps, hits)
+
+    def line_endpoints_many(self, xs, ys):
+        if self.full_index is None:
+            self.full_index = EdgeIndex(self.complete())
+        return self.full_index.line_endpoints_many(xs, ys)
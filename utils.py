@@ -17,56 +17,290 @@
 # utils.py
 # contains the utility functions used in the main application.
 
+import functools
+import sys
+import time
 import numpy as np
-import cv2
+import cairo
 import gi
-import os
-import pyscreenshot
+import capture
+from screenshot import ScreenshotSaver
+from capture import grab_screen
+from imaging import load_image, gray_image, edge_engine, CannyEngine
 
 gi.require_version("Gtk", "3.0")
 gi.require_version("GdkPixbuf", "2.0")
-from gi.repository import Gtk, GdkPixbuf, Gdk
+from gi.repository import Gtk, GdkPixbuf, Gdk, GLib
+from overlay import queue_overlay_draw
+from profiler import timed
+from view import image_pyramid, fit_scale, set_view, to_screen, to_image
+from view import follow_cursor
+from rays import ray_angles, axis_aligned
+from snap import SnapMap, snap_position
+from elements import ElementIndex, update_element
+from edge_overlay import EdgeOverlay
+from derived import build_derived
 
+# Screenshots go to the current directory like they always did
+screenshot_saver = ScreenshotSaver()
 
+# Arguments with these extensions are played as videos
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov", ".m4v")
+
+# Maps built from every edge map, see rebuild_derived
+DERIVED_MAPS = ("snap_map", "element_index", "edge_overlay")
+
+# What an action invalidates, recomputed on the next frame clock tick
+REDRAW = 0
+LINES = 1
+EDGES = 2
+COLORS = 4
+
+
+def set_defaults(self):
+    # Default values
+    self.step_size = 1
+    self.step_size_mp = 1
+    self.font_size = 12
+    self.stats_font_size = 12
+    self.line_thickness = 1
+    self.offset = [0, 0]
+    self.TEXT_DISPLAY_THRESHOLD = 80
+    self.colors = [
+        (1, 0, 0),  # Red
+        (0, 1, 0),  # Green
+        (0, 1, 1),  # Cyan
+        (1, 0, 1),  # Magenta
+        (1, 1, 0),  # Yellow
+    ]
+    self.line_text_color = self.colors[1]
+    self.stats_text_color = self.colors[1]
+    self.line_color = self.colors[0]
+    self.is_live_colors = False
+    self.cursor_pos = [0, 0]
+    self.pointer_pos = [0, 0]
+    self.line_endpoints = []
+    # Rays measured and their rotation in degrees, see rays.py, line_angles
+    # is None while the four axis-aligned lines are shown
+    self.ray_count = 4
+    self.ray_rotation = 0
+    self.line_angles = None
+    # Snapping mode, see snap.py, and whether the element under the cursor is
+    # outlined, see elements.py
+    self.snap_mode = None
+    self.show_elements = False
+    self.element = None
+    # Whether the edge map is tinted over the image, see edge_overlay.py
+    self.show_edges = False
+    # Edge engine of the current image, see canny.py
+    self.canny = None
+    # Maps derived from the current edges once built (None until then) and
+    # the futures building them, see rebuild_derived
+    self.snap_map = None
+    self.element_index = None
+    self.edge_overlay = None
+    self.derived_pending = {}
+    self.overlay_rects = []
+    self.tick_id = None
+    self.dirty = REDRAW
+    # Input events handled vs frames actually recomputed and drawn
+    self.events_received = 0
+    self.frames_computed = 0
+    self.stats_pos = [100, 100]
+    # Window position of image pixel (0, 0) and window pixels per image pixel
+    self.view_mode = "fit"
+    self.view_origin = [0, 0]
+    self.view_scale = 1
+    self.view_size = (0, 0)
+    self.lower_threshold = 50
+    self.upper_threshold = 70
+    # Seconds the screen capture took, None for images passed as arguments
+    self.capture_time = None
+    # Recorder of the input events with --record, see recorder.py
+    self.recorder = None
+    # Timeout source of the live mode captures, None outside of live mode
+    self.live = None
+    # Set while the overlay is taken off the screen for a live capture
+    self.overlay_hidden = False
+    # Timeout source rebuilding the derived maps once the live screen settled
+    self.settle_timer = None
+    # VideoSource of the current argument if it is a video
+    self.video = None
+    self.frame_index = 0
+    # Timeout source of the video playback, None when paused
+    self.playing = None
+    self.startup_profile = None
+
+
+@timed
 def live_colors(self):
     if not self.is_live_colors:
         return
     x, y = self.cursor_pos
-    r, g, b = 1 - self.img[y][x] / 255
+    b, g, r = 1 - self.img[y][x][:3] / 255
     self.line_color = (r, g, b)
     self.line_text_color = (r, g, b)
-    x, y = self.stats_pos
-    r, g, b = 1 - self.img[y][x] / 255
+    x, y = to_image(self, *self.stats_pos)
+    b, g, r = 1 - self.img[y][x][:3] / 255
     self.stats_text_color = (r, g, b)
 
 
+@timed
 def update_edges_and_pixbuf(self):
-    # Convert the image to grayscale & Enhance contrast using histogram equalization
-    self.gray = cv2.equalizeHist(cv2.cvtColor(self.img, cv2.COLOR_RGB2GRAY))
-    # Detect edges using Canny
-    self.edges = cv2.Canny(self.gray, self.lower_threshold, self.upper_threshold)
-    # Convert OpenCV image to GdkPixbuf
-    height, width, channels = self.img.shape
-    self.pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-        self.img.tobytes(),
-        GdkPixbuf.Colorspace.RGB,
-        False,
-        8,
-        width,
-        height,
-        width * channels,
-        None,
-        None,
+    self.gray, self.canny = edge_engine(self.img)
+    update_edges(self)
+    self.pyramid = new_pyramid(self.img, fit_scale(self.img, self.view_size))
+    self.surface = self.pyramid[0]
+
+
+def new_surface(img):
+    # Wrap the BGRA pixels in a cairo surface without copying them, the
+    # surface keeps a reference to the array for as long as it lives
+    height, width, channels = img.shape
+    return cairo.ImageSurface.create_for_data(
+        img, cairo.FORMAT_RGB24, width, height, width * channels
     )
 
 
-def prepare_image(self, img):
-    geometry = Gdk.Monitor.get_geometry(Gdk.Display.get_default().get_monitor(0))
-    screen_width = geometry.width
-    screen_height = geometry.height
-    self.img = cv2.imread(img)
-    self.img = cv2.resize(self.img, (screen_width, screen_height))
-    self.img = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)
+def new_pyramid(img, min_scale=1):
+    # Surfaces of the image and of its halved copies for zoomed out views
+    return [new_surface(level) for level in image_pyramid(img, min_scale)]
+
+
+@timed
+def update_edges(self, derived=True):
+    # Detect edges using Canny, reusing the gradients and cached edge maps of
+    # the current image, along with the index used by update_lines
+    self.edge_index = self.canny.index(
+        self.lower_threshold, self.upper_threshold, self.cursor_pos
+    )
+    self.edges = self.edge_index.edges
+    if derived:
+        rebuild_derived(self)
+
+
+def derived_builds(self):
+    # What to build from the edges for the enabled modes
+    builds = {}
+    if self.snap_mode is not None:
+        builds["snap_map"] = functools.partial(SnapMap, mode=self.snap_mode)
+    if self.show_elements:
+        builds["element_index"] = ElementIndex
+    if self.show_edges:
+        builds["edge_overlay"] = functools.partial(
+            EdgeOverlay, min_scale=fit_scale(self.img, self.view_size)
+        )
+    return builds
+
+
+def drop_derived(self, *names):
+    """Drop the maps derived from the old edges, all of them by default."""
+    builds = derived_builds(self)
+    for name in names or DERIVED_MAPS:
+        if name != "edge_overlay" or name not in builds:
+            # Nothing is looked up until the map of the new edges is built,
+            # the overlay is only drawn and shows the old edges until then
+            setattr(self, name, None)
+        if name in self.derived_pending:
+            self.derived_pending.pop(name).cancel()
+
+
+def rebuild_derived(self, *names):
+    """Rebuild the maps derived from the edges, all of them by default."""
+    drop_derived(self, *names)
+    builds = derived_builds(self)
+    for name in names or DERIVED_MAPS:
+        if name not in builds:
+            continue
+        future = build_derived(name, self.edge_index, builds[name])
+        self.derived_pending[name] = future
+        future.add_done_callback(
+            lambda future, name=name: GLib.idle_add(derived_ready, self, name, future)
+        )
+
+
+def derived_ready(self, name, future):
+    # Back on the main thread, maps of edges replaced since are dropped
+    if self.derived_pending.get(name) is not future or future.cancelled():
+        return GLib.SOURCE_REMOVE
+    del self.derived_pending[name]
+    if future.exception() is not None:
+        print(
+            f"pixruler: building the {name} failed: {future.exception()}",
+            file=sys.stderr,
+        )
+        return GLib.SOURCE_REMOVE
+    setattr(self, name, future.result())
+    if name == "snap_map":
+        self.cursor_pos = snap_position(self, self.cursor_pos)
+    if name == "edge_overlay":
+        # Tinted all over the image, not only around the overlay
+        self.queue_draw()
+    queue_update(self)
+    return GLib.SOURCE_REMOVE
+
+
+def pointer_monitor():
+    """GDK index of the monitor under the pointer."""
+    display = Gdk.Display.get_default()
+    _, x, y = display.get_default_seat().get_pointer().get_position()
+    monitor = display.get_monitor_at_point(x, y)
+    for index in range(display.get_n_monitors()):
+        if display.get_monitor(index) == monitor:
+            return index
+    return 0
+
+
+def screen_size(monitor=0):
+    geometry = Gdk.Display.get_default().get_monitor(monitor).get_geometry()
+    return geometry.width, geometry.height
+
+
+def monitor_bbox(monitor):
+    """(x0, y0, x1, y1) of a monitor in screen pixels, for grab_screen."""
+    gdk_monitor = Gdk.Display.get_default().get_monitor(monitor)
+    geometry = gdk_monitor.get_geometry()
+    scale = gdk_monitor.get_scale_factor()
+    x0, y0 = geometry.x * scale, geometry.y * scale
+    return x0, y0, x0 + geometry.width * scale, y0 + geometry.height * scale
+
+
+def is_video(path):
+    return path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def show_image(self, index):
+    # Switch to sys.argv[index] through the prefetching image cache
+    self.current_arg_index = index
+    thresholds = (self.lower_threshold, self.upper_threshold)
+    bundle = self.image_cache.get(index, *thresholds, self.cursor_pos)
+    show_bundle(self, bundle)
+    self.image_cache.prefetch(index, *thresholds, self.cursor_pos)
+
+
+def persist_edges(self):
+    # Only the edge map on display when an image is left goes to the disk
+    # cache, not every one the thresholds were scrolled past
+    if isinstance(self.canny, CannyEngine):
+        self.canny.persist([(self.lower_threshold, self.upper_threshold)])
+
+
+@timed
+def show_bundle(self, bundle, fit=True):
+    persist_edges(self)
+    # Keep the cursor where it is on the screen
+    cursor = to_screen(self, *self.cursor_pos)
+    self.img = bundle.img
+    self.gray = bundle.gray
+    self.canny = bundle.canny
+    self.pyramid = bundle.pyramid
+    self.surface = bundle.pyramid[0]
+    if fit:
+        set_view(self, "fit")
+    self.cursor_pos = to_image(self, *cursor)
+    update_edges(self)
+    # A new image invalidates the whole window, not just the overlay
+    self.queue_draw()
 
 
 def adjust_value(value, step, increase=True, min_value=None, max_value=None):
@@ -81,48 +315,75 @@ def adjust_value(value, step, increase=True, min_value=None, max_value=None):
     return value
 
 
+@timed
 def update_lines(self):
-    # Update line endpoints based on cursor position and detected border
-    self.line_endpoints = [
-        (self.cursor_pos[0], 0),  # Line from cursor to top border
-        # Line from cursor to bottom border
-        (self.cursor_pos[0], self.img.shape[0] - 1),
-        (0, self.cursor_pos[1]),  # Line from cursor to left border
-        (self.img.shape[1] - 1, self.cursor_pos[1]),
-    ]  # Line from cursor to right border
-
-    # Update line lengths based on edge detection
-    for i, (start, end) in enumerate(zip([self.cursor_pos] * 4, self.line_endpoints)):
-        has_edge, new_end = detect_edge_along_line(start, end, self.edges)
-        if has_edge:
-            self.line_endpoints[i] = new_end
-
-
-def detect_edge_along_line(start, end, edges):
-    """Detect if an edge exists along the line."""
-    # Calculate the distance between start and end points
-    distance = cv2.norm(np.array(end) - np.array(start))
-
-    # Generate points along the line
-    points = np.linspace(start, end, int(distance))
-
-    # Check for edge in the path
-    for point in points:
-        x, y = point.astype(int)
-        if edges[y, x] > 0:
-            return True, (x, y)  # Return True and the position of the edge
-    return False, end  # Return False if no edge is detected
-
-
-def save_screenshot():
-    base_filename = "screenshot.png"
-    count = 0
-    while True:
-        # Check if the file exists
-        if os.path.exists(base_filename):
-            count += 1
-            base_filename = f"screenshot_{count:02}.png"  # Padded count
-        else:
-            # Save the screenshot with the unique filename
-            pyscreenshot.grab().save(base_filename)
-            break
+    # Update line endpoints (top, bottom, left, right) to the nearest edge
+    # along each ray, or to the border when there is none
+    if axis_aligned(self):
+        self.line_angles = None
+        self.line_endpoints = self.edge_index.line_endpoints(self.cursor_pos)
+        return
+    self.line_angles = ray_angles(self.ray_count, self.ray_rotation)
+    self.line_endpoints = self.edge_index.ray_endpoints(
+        self.cursor_pos, self.line_angles
+    )
+
+
+def queue_update(self, invalidates=LINES):
+    # Input handlers only record state and what it invalidates, the expensive
+    # recompute and the redraw run once per frame clock tick however many
+    # events arrived in between, so a held key recomputes once per frame
+    self.dirty |= invalidates
+    if self.tick_id is None:
+        self.tick_id = self.add_tick_callback(on_frame_tick)
+
+
+@timed
+def on_frame_tick(self, frame_clock):
+    self.tick_id = None
+    self.frames_computed += 1
+    dirty, self.dirty = self.dirty, REDRAW
+    # New edges move the lines, and moved lines the colors under them
+    if dirty & EDGES:
+        update_edges(self)
+        dirty |= LINES
+    if dirty & LINES:
+        follow_cursor(self)
+        update_lines(self)
+        update_element(self)
+        dirty |= COLORS
+    if dirty & COLORS:
+        live_colors(self)
+    queue_overlay_draw(self)
+    return GLib.SOURCE_REMOVE
+
+
+def startup_mark(self, stage):
+    if self.startup_profile is not None:
+        self.startup_profile.append((stage, time.perf_counter()))
+
+
+def print_startup_profile(marks):
+    print("pixruler startup (ms):", file=sys.stderr)
+    for (_, previous), (stage, mark) in zip(marks, marks[1:]):
+        print(f"  {stage:30} {(mark - previous) * 1000:8.1f}", file=sys.stderr)
+    total = (marks[-1][1] - marks[0][1]) * 1000
+    print(f"  {'total':30} {total:8.1f}", file=sys.stderr)
+
+
+def save_screenshot(self, overlay=True):
+    # Save the frame on display with the lines and stats drawn in, or the
+    # image at its native resolution when overlay is False, the PNG encoding
+    # runs on the saver's worker thread
+    if overlay:
+        width, height = self.view_size
+        target = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        self.on_draw(None, cairo.Context(target))
+        target.flush()
+        frame = np.ndarray(
+            (height, target.get_stride() // 4, 4), np.uint8, target.get_data()
+        )[:, :width]
+    else:
+        # Images are replaced, never modified in place, so no copy is needed
+        frame = self.img
+    screenshot_saver.save(frame)
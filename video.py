@@ -0,0 +1,231 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# video.py
+# contains the video input. Videos passed as arguments are stepped through
+# frame by frame with n/N or played with SPACE. A decoder thread runs a
+# cv2.VideoCapture generator and hands every frame to worker threads that
+# prepare its gray and edge maps, the results wait in a bounded look-ahead
+# queue in front of the playhead. Seeking reuses the open capture for short
+# jumps ahead and otherwise seeks to the keyframe before the target instead
+# of decoding everything in between.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lazy import lazy_import
+from utils import show_image, show_bundle, update_lines, adjust_value, is_video
+from image_cache import prepare_bundle
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+
+cv2 = lazy_import("cv2")
+
+# Prepared frames kept ahead of the playhead
+LOOKAHEAD = 8
+WORKERS = 2
+# Jumps ahead up to this many frames decode through, longer ones and jumps
+# back seek to the keyframe before the target
+SEEK_DISTANCE = 30
+
+
+def read_frames(path):
+    """Yield (index, frame) in order, send an index to skip to it instead.
+
+    frame is None past the end of the video.
+    """
+    capture = cv2.VideoCapture(path)
+    index = 0
+    try:
+        while True:
+            ok, frame = capture.read()
+            target = yield index, (frame if ok else None)
+            if target is None:
+                index += 1
+                continue
+            if index < target <= index + SEEK_DISTANCE:
+                # grab() decodes without converting the frame
+                for _ in range(target - index - 1):
+                    capture.grab()
+            else:
+                # The FFmpeg backend seeks to the keyframe before target and
+                # decodes forward from there
+                capture.set(cv2.CAP_PROP_POS_FRAMES, target)
+            index = target
+    finally:
+        capture.release()
+
+
+def prepare_frame(frame, width, height, lower, upper):
+    img = cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA)
+    return prepare_bundle(img, width, height, lower, upper)
+
+
+class VideoSource:
+
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise OSError(f"could not open {path}")
+        self.frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 25
+        capture.release()
+        self.thresholds = (50, 70)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.generation = 0
+        self.seek_to = None
+        self.next_index = 0
+        self.closed = False
+        self.queue = queue.Queue(maxsize=LOOKAHEAD)
+        self.executor = ThreadPoolExecutor(
+            max_workers=WORKERS, thread_name_prefix="pixruler-video"
+        )
+        self.decoder = threading.Thread(
+            target=self.decode, name="pixruler-decode", daemon=True
+        )
+        self.decoder.start()
+
+    def decode(self):
+        frames = read_frames(self.path)
+        generation = self.generation
+        item = next(frames)
+        try:
+            while not self.closed:
+                index, frame = item
+                if frame is None:
+                    # Past the end, tell the reader and wait for a seek
+                    self.queue.put((generation, index, None))
+                    self.wake.wait()
+                    self.wake.clear()
+                else:
+                    future = self.executor.submit(
+                        prepare_frame, frame, self.width, self.height, *self.thresholds
+                    )
+                    # Blocks while the look-ahead queue is full
+                    self.queue.put((generation, index, future))
+                # A seek asked for after this point is tagged with the next
+                # generation, so frames decoded before it are dropped
+                with self.lock:
+                    target, self.seek_to = self.seek_to, None
+                    generation = self.generation
+                item = frames.send(target) if target is not None else next(frames)
+        finally:
+            frames.close()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def seek(self, index):
+        with self.lock:
+            self.generation += 1
+            self.seek_to = index
+        self.drain()
+        self.wake.set()
+
+    def drain(self):
+        while True:
+            try:
+                _, _, future = self.queue.get_nowait()
+            except queue.Empty:
+                return
+            if future is not None:
+                future.cancel()
+
+    def get(self, index, lower, upper):
+        """Return the ImageBundle of frame index, None past the end."""
+        self.thresholds = (lower, upper)
+        if index != self.next_index:
+            self.seek(index)
+        while True:
+            generation, i, future = self.queue.get()
+            if generation != self.generation or i < index:
+                continue
+            self.next_index = i + 1
+            if future is None:
+                return None
+            return future.result()
+
+    def close(self):
+        # The decoder shuts the workers down once it sees closed
+        self.closed = True
+        self.drain()
+        self.wake.set()
+
+
+def show_item(self, index):
+    # Show sys.argv[index], videos from their first frame
+    stop_playing(self)
+    if self.video is not None:
+        self.video.close()
+        self.video = None
+    path = self.image_cache.paths[index]
+    if not is_video(path):
+        show_image(self, index)
+        return
+    self.current_arg_index = index
+    self.video = VideoSource(path, *self.view_size)
+    show_frame(self, 0, fit=True)
+
+
+def show_frame(self, index, fit=False):
+    bundle = self.video.get(index, self.lower_threshold, self.upper_threshold)
+    if bundle is None:
+        # CAP_PROP_FRAME_COUNT is only an estimate for some containers
+        self.video.frame_count = index
+        return False
+    self.frame_index = index
+    show_bundle(self, bundle, fit)
+    return True
+
+
+def step_media(self, forward=True):
+    # n/N step through the frames of a video, by the step size, and on to
+    # the neighbouring arguments at its ends
+    if self.video is not None:
+        index = adjust_value(self.frame_index, self.step_size, forward)
+        if 0 <= index < self.video.frame_count and show_frame(self, index):
+            return
+    index = adjust_value(self.current_arg_index, 1, forward, 1, self.arg_count - 1)
+    if index != self.current_arg_index:
+        show_item(self, index)
+
+
+def toggle_play(self):
+    if self.video is None:
+        return
+    if self.playing is not None:
+        stop_playing(self)
+        return
+    self.playing = GLib.timeout_add(max(1, int(1000 / self.video.fps)), play_tick, self)
+
+
+def stop_playing(self):
+    if self.playing is not None:
+        GLib.source_remove(self.playing)
+        self.playing = None
+
+
+def play_tick(self):
+    index = self.frame_index + 1
+    if index >= self.video.frame_count or not show_frame(self, index):
+        self.playing = None
+        return GLib.SOURCE_REMOVE
+    update_lines(self)
+    return GLib.SOURCE_CONTINUE
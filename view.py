@@ -0,0 +1,169 @@
+# This file is part of pixruler.
+#
+# Copyright (c) 2024 Sahil <118348625+Sahil-958@users.noreply.github.com>
+# pixruler is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pixruler is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pixruler.  If not, see <https://www.gnu.org/licenses/>.
+
+# view.py
+# contains the view transform between image pixels and window pixels. Images
+# are kept at their native resolution, so the cursor, the edge queries and
+# the reported lengths are all in source pixels; the window shows the image
+# scaled to fit or at 1:1 and panned through a cairo transform. Zoomed out
+# views paint from a mipmap level close to the window size instead of
+# resampling the full image on every frame.
+
+import cairo
+from lazy import lazy_import
+
+cv2 = lazy_import("cv2")
+
+# Window pixels kept between the cursor and the window border at 1:1
+FOLLOW_MARGIN = 50
+
+
+def image_pyramid(img, min_scale=1):
+    """img followed by halved copies, enough to paint it at min_scale."""
+    levels = [img]
+    while 0.5 ** len(levels) >= min_scale and min(levels[-1].shape[:2]) > 1:
+        height, width = levels[-1].shape[:2]
+        levels.append(
+            cv2.resize(
+                levels[-1],
+                ((width + 1) // 2, (height + 1) // 2),
+                interpolation=cv2.INTER_AREA,
+            )
+        )
+    return levels
+
+
+def fit_scale(img, view_size):
+    height, width = img.shape[:2]
+    return min(view_size[0] / width, view_size[1] / height)
+
+
+def to_screen(self, x, y):
+    return (
+        x * self.view_scale + self.view_origin[0],
+        y * self.view_scale + self.view_origin[1],
+    )
+
+
+def to_image(self, x, y):
+    # Window position to the image pixel under it, clamped to the image
+    height, width = self.img.shape[:2]
+    return [
+        min(max(int((x - self.view_origin[0]) // self.view_scale), 0), width - 1),
+        min(max(int((y - self.view_origin[1]) // self.view_scale), 0), height - 1),
+    ]
+
+
+def set_view(self, mode, anchor=None):
+    """Show the image to fit the window or at 1:1, keeping anchor in place."""
+    self.view_mode = mode
+    scale = fit_scale(self.img, self.view_size) if mode == "fit" else 1
+    if anchor is not None:
+        x, y = (anchor[0] - self.view_origin[0], anchor[1] - self.view_origin[1])
+        self.view_origin = [
+            anchor[0] - x * scale / self.view_scale,
+            anchor[1] - y * scale / self.view_scale,
+        ]
+    self.view_scale = scale
+    clamp_view(self)
+    self.queue_draw()
+
+
+def toggle_view(self):
+    # Zoom around the cursor so it stays where it is on the screen
+    if self.live is not None:
+        # The lines have to stay over the live screen they measure
+        return
+    mode = "1:1" if self.view_mode == "fit" else "fit"
+    set_view(self, mode, to_screen(self, *self.cursor_pos))
+
+
+def pan_view(self, dx, dy):
+    if self.live is not None:
+        return
+    origin = self.view_origin
+    self.view_origin = [origin[0] + dx, origin[1] + dy]
+    clamp_view(self)
+    # Panning moves the whole image, unless it could not move that way
+    if self.view_origin != origin:
+        self.queue_draw()
+
+
+def clamp_view(self):
+    # Center the image along axes where it is smaller than the window, and
+    # do not pan past its borders along the others
+    height, width = self.img.shape[:2]
+    for axis, size in enumerate((width, height)):
+        extent = size * self.view_scale
+        view = self.view_size[axis]
+        if extent <= view:
+            self.view_origin[axis] = (view - extent) / 2
+        else:
+            self.view_origin[axis] = min(max(self.view_origin[axis], view - extent), 0)
+
+
+def follow_cursor(self):
+    # Pan when the cursor is moved off the visible part of the image
+    x, y = to_screen(self, *self.cursor_pos)
+    dx = dy = 0
+    if x < FOLLOW_MARGIN:
+        dx = FOLLOW_MARGIN - x
+    elif x > self.view_size[0] - FOLLOW_MARGIN:
+        dx = self.view_size[0] - FOLLOW_MARGIN - x
+    if y < FOLLOW_MARGIN:
+        dy = FOLLOW_MARGIN - y
+    elif y > self.view_size[1] - FOLLOW_MARGIN:
+        dy = self.view_size[1] - FOLLOW_MARGIN - y
+    if dx or dy:
+        pan_view(self, dx, dy)
+
+
+def paint_image(self, cr):
+    height, width = self.img.shape[:2]
+    scale = self.view_scale
+    x0, y0 = self.view_origin
+    if (
+        x0 > 0
+        or y0 > 0
+        or width * scale + x0 < self.view_size[0]
+        or (height * scale + y0 < self.view_size[1])
+    ):
+        cr.set_source_rgb(0, 0, 0)
+        cr.paint()
+    paint_levels(self, cr, self.pyramid)
+
+
+def paint_levels(self, cr, levels):
+    """Paint the image sized surfaces of an image_pyramid at the view.
+
+    levels only has to support len() and indexing, see EdgeOverlay.
+    """
+    height, width = self.img.shape[:2]
+    scale = self.view_scale
+    # The smallest level that still has a pixel for every window pixel
+    level = 0
+    while level + 1 < len(levels) and 0.5 ** (level + 1) >= scale:
+        level += 1
+    surface = levels[level]
+    cr.save()
+    cr.translate(*self.view_origin)
+    cr.scale(scale * width / surface.get_width(), scale * height / surface.get_height())
+    cr.set_source_surface(surface, 0, 0)
+    if scale >= 1:
+        # Show enlarged pixels as they are
+        cr.get_source().set_filter(cairo.FILTER_NEAREST)
+    cr.paint()
+    cr.restore()